@@ -0,0 +1,136 @@
+from collections import OrderedDict
+import os
+import threading
+import time
+
+import six
+
+
+class LRUCache(object):
+    """
+    A thread-safe mapping holding at most ``maxsize`` entries.
+
+    When full, the least recently used entry is evicted. A ``maxsize`` of
+    zero disables the cache.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data.pop(key)
+            except KeyError:
+                return default
+
+            self._data[key] = value
+            return value
+
+    def set(self, key, value):
+        if self.maxsize <= 0:
+            return
+
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = value
+
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class CourseCache(object):
+    """
+    Hold each course's Canvas data for up to ``ttl`` seconds.
+
+    ``invalidate`` drops a course's data early. If ``marker_dir`` is set it
+    also touches a file named for the course there, and every process using
+    the same directory treats data fetched before that file changed as
+    stale. A ``ttl`` of zero disables the cache.
+    """
+
+    def __init__(self, ttl, maxsize, marker_dir=None):
+        """
+        :param ttl: Seconds data stays fresh without an invalidation.
+        :param maxsize: The most courses to hold at once.
+        :param marker_dir: A directory shared by all worker processes.
+        """
+        self.ttl = ttl
+        self.marker_dir = marker_dir
+        # Maps each course id to when it was last invalidated in this
+        # process and its data, keyed on Canvas instance and scope.
+        self._courses = LRUCache(maxsize if ttl > 0 else 0)
+        self._lock = threading.Lock()
+
+    def get(self, key, course_id):
+        """
+        Return the fresh data stored under ``key`` for a course, or ``None``.
+        """
+        course_id = six.text_type(course_id)
+        invalidated_at, entries = self._courses.get(course_id, (0, {}))
+        entry = entries.get(key)
+        if entry is None:
+            return None
+
+        fetched_at, value = entry
+        if time.time() - fetched_at >= self.ttl:
+            return None
+        if fetched_at <= max(invalidated_at, self.marker_time(course_id)):
+            return None
+        return value
+
+    def set(self, key, course_id, value, fetched_at):
+        """
+        Store data for a course under ``key``.
+
+        :param fetched_at: When fetching began, so that an invalidation
+            arriving mid-fetch still marks the data stale.
+        """
+        course_id = six.text_type(course_id)
+        with self._lock:
+            invalidated_at, entries = self._courses.get(course_id, (0, {}))
+            entries = dict(entries)
+            entries[key] = (fetched_at, value)
+            self._courses.set(course_id, (invalidated_at, entries))
+
+    def invalidate(self, course_id):
+        """
+        Mark everything fetched for a course so far as stale.
+        """
+        course_id = six.text_type(course_id)
+        with self._lock:
+            self._courses.set(course_id, (time.time(), {}))
+
+        if self.marker_dir:
+            if not os.path.isdir(self.marker_dir):
+                try:
+                    os.makedirs(self.marker_dir)
+                except OSError:
+                    # Another worker may have just created it.
+                    if not os.path.isdir(self.marker_dir):
+                        raise
+
+            path = self.marker_path(course_id)
+            with open(path, "a"):
+                os.utime(path, None)
+
+    def marker_time(self, course_id):
+        if not self.marker_dir:
+            return 0
+
+        try:
+            return os.path.getmtime(self.marker_path(course_id))
+        except OSError:
+            return 0
+
+    def marker_path(self, course_id):
+        return os.path.join(self.marker_dir, "course-{}".format(course_id))
@@ -0,0 +1,189 @@
+import threading
+import time
+
+from canvasapi import Canvas
+from canvasapi.exceptions import CanvasException
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+
+class CanvasBusy(CanvasException):
+    """
+    A Canvas instance has no request budget left within the wait time.
+    """
+
+
+class Limiter(object):
+    """
+    Cap the requests in flight and the request rate for one Canvas instance.
+
+    The rate is a token bucket refilled at ``rate`` tokens per second and
+    holding at most ``burst``. A ``rate`` of 0 means no rate limit.
+    """
+
+    def __init__(self, max_concurrent, rate=0, burst=1):
+        self.max_concurrent = max_concurrent
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.in_flight = 0
+        self.tokens = float(self.burst)
+        self._updated = time.time()
+        self._condition = threading.Condition()
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(
+                self.burst, self.tokens + (now - self._updated) * self.rate
+            )
+        self._updated = now
+
+    def acquire(self, timeout):
+        """
+        Wait up to ``timeout`` seconds for a free slot and a token.
+
+        :returns: ``True`` if acquired, in which case ``release`` must be
+            called when the request finishes.
+        """
+        deadline = time.time() + timeout
+
+        with self._condition:
+            while True:
+                now = time.time()
+                self._refill(now)
+
+                has_slot = self.in_flight < self.max_concurrent
+                has_token = not self.rate or self.tokens >= 1
+                if has_slot and has_token:
+                    self.in_flight += 1
+                    if self.rate:
+                        self.tokens -= 1
+                    return True
+
+                remaining = deadline - now
+                if remaining <= 0:
+                    return False
+
+                wait = remaining
+                if has_slot:
+                    # Only short of tokens: sleep until the next one is due.
+                    wait = min(wait, (1 - self.tokens) / self.rate)
+                self._condition.wait(wait)
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+
+class LimitedAdapter(HTTPAdapter):
+    """
+    An ``HTTPAdapter`` that passes every request through a ``Limiter``.
+
+    The slot is held until the response body has been read, so downloading
+    a large page counts against ``max_concurrent``. Streamed responses
+    release it once their headers arrive.
+    """
+
+    def __init__(self, limiter, wait, **kwargs):
+        self.limiter = limiter
+        self.wait = wait
+        super(LimitedAdapter, self).__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if not self.limiter.acquire(self.wait):
+            raise CanvasBusy(
+                "Canvas is busy right now. Please try again in a few minutes."
+            )
+
+        try:
+            response = super(LimitedAdapter, self).send(request, **kwargs)
+            if not kwargs.get("stream"):
+                # requests reads the body after the adapter returns.
+                response.content
+            return response
+        finally:
+            self.limiter.release()
+
+
+class ClientRegistry(object):
+    """
+    Build and cache one Canvas client per Canvas domain.
+
+    Each client has its own connection pool and ``Limiter``, so a slow
+    instance can only tie up its own connections and budget. Domains not
+    listed in ``CANVAS_DOMAINS`` share the default ``CANVAS_URL`` client.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self._clients = {}
+        self._lock = threading.Lock()
+
+    def settings(self, domain):
+        """
+        Return the connection settings for ``domain``, filling in defaults.
+        """
+        config = self.config
+        settings = {
+            "url": config["CANVAS_URL"],
+            "api_key": config["API_KEY"],
+            "pool_size": config["CANVAS_POOL_SIZE"],
+            "max_concurrent": config["CANVAS_MAX_CONCURRENT"],
+            "rate": config["CANVAS_RATE_LIMIT"],
+            "burst": config["CANVAS_RATE_BURST"],
+            "wait": config["CANVAS_BUSY_TIMEOUT"],
+        }
+        settings.update(config["CANVAS_DOMAINS"].get(domain, {}))
+        return settings
+
+    def key(self, domain):
+        return domain if domain in self.config["CANVAS_DOMAINS"] else None
+
+    def get(self, domain=None):
+        """
+        Return the Canvas client for ``domain``, creating it on first use.
+        """
+        key = self.key(domain)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+
+        with self._lock:
+            if key not in self._clients:
+                self._clients[key] = self.build(self.settings(domain))
+            return self._clients[key]
+
+    def url(self, domain=None):
+        return self.settings(self.key(domain))["url"]
+
+    def build(self, settings):
+        canvas = Canvas(settings["url"], settings["api_key"])
+
+        adapter = LimitedAdapter(
+            Limiter(settings["max_concurrent"], settings["rate"], settings["burst"]),
+            settings["wait"],
+            pool_connections=1,
+            pool_maxsize=settings["pool_size"],
+        )
+        session = requests_session(canvas)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return canvas
+
+
+def requests_session(canvas):
+    """
+    Return the ``requests`` session a canvasapi ``Canvas`` sends calls with.
+
+    canvasapi keeps it on a private attribute, so fail clearly if an
+    upgrade moves it rather than silently losing the per-domain limits.
+    """
+    requester = getattr(canvas, "_Canvas__requester", None)
+    session = getattr(requester, "_session", None)
+    if not isinstance(session, Session):
+        raise RuntimeError(
+            "Can't find the requests session of this canvasapi version's "
+            "Canvas client. Update clients.requests_session to match it."
+        )
+    return session
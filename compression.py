@@ -0,0 +1,63 @@
+import gzip
+import io
+
+try:  # pragma: no cover
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+def gzip_compress(data, level):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode="wb", compresslevel=level) as f:
+        f.write(data)
+    return buffer.getvalue()
+
+
+def choose_encoding(accept_encodings):
+    """
+    Pick the best encoding the client accepts, or ``None``.
+
+    Brotli is only offered when the optional ``brotli`` package is installed.
+
+    :param accept_encodings: The request's parsed ``Accept-Encoding`` header.
+    """
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compress_response(response, accept_encodings, config):
+    """
+    Compress a buffered text response in place if the client accepts it.
+
+    Streamed, already encoded, non-2xx and small responses are left alone.
+    """
+    if (
+        not 200 <= response.status_code < 300
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in config["COMPRESS_MIMETYPES"]
+    ):
+        return response
+
+    data = response.get_data()
+    if len(data) < config["COMPRESS_MIN_SIZE"]:
+        return response
+
+    encoding = choose_encoding(accept_encodings)
+    if encoding == "br":
+        data = brotli.compress(data, quality=config["COMPRESS_BROTLI_QUALITY"])
+    elif encoding == "gzip":
+        data = gzip_compress(data, config["COMPRESS_LEVEL"])
+    else:
+        return response
+
+    response.set_data(data)
+    response.headers["Content-Encoding"] = encoding
+    response.vary.add("Accept-Encoding")
+
+    return response
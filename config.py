@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+from __future__ import unicode_literals
+
+DEBUG = False
+
+# A secret key used by Flask for signing. KEEP THIS SECRET!
+# (e.g. 'JbwLnLgsfxDInozQudc6IFPe0eYecW8f')
+SECRET_KEY = "CHANGEME"
+
+# Chrome 80 SameSite=None; Secure fix
+SESSION_COOKIE_SECURE = True
+SESSION_COOKIE_SAMESITE = "None"
+
+# A list of domains that are allowed to use the tool. (e.g. ['example.com', 'example.edu'])
+ALLOWED_CANVAS_DOMAINS = []
+
+# Canvas Instance URL ex. `https://example.instructure.com`
+CANVAS_URL = "https://example.com"
+API_KEY = "CHANGEME"  # Canvas API Key
+
+PYLTI_CONFIG = {
+    "consumers": {
+        "key": {  # consumer key
+            "secret": b"secret"  # shared secret must be bytes (b'')
+        }
+    },
+    "roles": {
+        "staff": [
+            "urn:lti:instrole:ims/lis/Administrator",
+            "Instructor",
+            "ContentDeveloper",
+            "urn:lti:role:ims/lis/TeachingAssistant",
+        ]
+    },
+}
+
+TIME_ZONE = "US/Eastern"
+LOCAL_TIME_FORMAT = "%m/%d/%Y %I:%M %p"
+
+LOG_FILE = "logs/due_date_changer.log"
+LOG_FORMAT = "%(asctime)s [%(levelname)s] {%(filename)s:%(lineno)d} %(message)s"
+LOG_LEVEL = "WARNING"
+LOG_MAX_BYTES = 1024 * 1024 * 5  # 5 MB
+LOG_BACKUP_COUNT = 1
+# Records are written by a background thread. This many can wait in memory
+# before new ones are dropped and counted. Set to 0 to write synchronously.
+LOG_QUEUE_SIZE = 10000
+LOG_JSON = False  # One JSON object per line instead of LOG_FORMAT.
+# "size" rotates at LOG_MAX_BYTES. With several worker processes writing to
+# one LOG_FILE, use "external" and rotate with logrotate instead.
+LOG_ROTATION = "size"
+
+# Seconds to cache the Canvas API key check reported by /status.
+STATUS_API_CHECK_TTL = 300
+
+# Number of rendered assignment rows to keep in memory per worker.
+FRAGMENT_CACHE_SIZE = 5000
+
+# Compression of HTML, JSON and XML responses. Brotli is used instead of gzip
+# when the client accepts it and the optional `brotli` package is installed.
+COMPRESS_MIMETYPES = ["text/html", "application/json", "application/xml"]
+COMPRESS_MIN_SIZE = 500  # bytes
+COMPRESS_LEVEL = 6  # gzip, 1-9
+COMPRESS_BROTLI_QUALITY = 4  # brotli, 0-11
+
+# Number of assignment edits to send to Canvas at once. 1 saves them in order.
+EDIT_WORKERS = 4
+
+# Number of assignment overrides to save per Canvas API call (at most 50).
+OVERRIDE_BATCH_SIZE = 50
+
+GOOGLE_ANALYTICS = ""  # The Google Analytics ID to use.
@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+
+
+class CachedCheck(object):
+    """
+    Cache the result of a slow health check and refresh it in the background.
+
+    Reading the result never waits on the check itself. Once the cached
+    value is older than ``ttl`` seconds, the next read starts a single
+    background thread to refresh it and returns the previous value in the
+    meantime. Until the first refresh finishes the value is ``None``.
+    """
+
+    def __init__(self, check, ttl):
+        """
+        :param check: A callable returning a truthy value when healthy.
+        :param ttl: Seconds a result stays fresh before it is refreshed.
+        """
+        self.check = check
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        self.value = None
+        self.checked_at = None
+        self._refreshing = False
+        self._pid = os.getpid()
+
+    def result(self):
+        """
+        Return the cached ``(value, checked_at)`` pair, scheduling a refresh
+        if it is stale.
+        """
+        now = time.time()
+
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked since the last read; the parent's refresh thread
+                # did not come with us.
+                self._reset()
+
+            stale = self.checked_at is None or now - self.checked_at >= self.ttl
+            if stale and not self._refreshing:
+                self._refreshing = True
+                thread = threading.Thread(target=self.refresh)
+                thread.daemon = True
+                thread.start()
+
+            return self.value, self.checked_at
+
+    def refresh(self):
+        """
+        Run the check now and store its result.
+        """
+        try:
+            value = bool(self.check())
+        except Exception:
+            value = False
+
+        with self._lock:
+            self.value = value
+            self.checked_at = time.time()
+            self._refreshing = False
+
+        return value
@@ -0,0 +1,43 @@
+"""
+Sign LTI launch URLs the way a tool consumer does, for the tests and
+``loadtest.py``.
+"""
+
+import oauthlib.oauth1
+from six.moves.urllib.parse import urlencode
+
+
+def generate_launch_request(
+    url,
+    body=None,
+    http_method="GET",
+    base_url="http://localhost",
+    roles="Instructor",
+    headers=None,
+):
+    """
+    Return ``url`` with an OAuth signature for the ``key``/``secret``
+    consumer added to its query string.
+    """
+    params = {}
+
+    if roles is not None:
+        params["roles"] = roles
+
+    urlparams = urlencode(params)
+
+    client = oauthlib.oauth1.Client(
+        "key",
+        client_secret="secret",
+        signature_method=oauthlib.oauth1.SIGNATURE_HMAC,
+        signature_type=oauthlib.oauth1.SIGNATURE_TYPE_QUERY,
+    )
+    signature = client.sign(
+        "{}{}?{}".format(base_url, url, urlparams),
+        body=body,
+        http_method=http_method,
+        headers=headers,
+    )
+    signed_url = signature[0]
+    new_url = signed_url[len(base_url) :]
+    return new_url
@@ -0,0 +1,141 @@
+"""
+Read Canvas Live Events, and send fake ones for local testing.
+
+The ``/live_events`` endpoint takes a Live Event in Canvas format, or a list
+of them, as JSON. The raw body must be signed with HMAC-SHA256 using
+``LIVE_EVENTS_SECRET``, hex encoded in the ``X-Live-Events-Signature``
+header. Canvas delivers events through a queue or webhook of its own, so
+run a small relay that reads them and signs each one before posting it.
+
+Run ``python liveevents.py --help`` to send a fake event to a running app.
+"""
+
+from __future__ import print_function
+
+import argparse
+import hashlib
+import hmac
+import json
+
+import six
+
+SIGNATURE_HEADER = "X-Live-Events-Signature"
+
+# Events that can change the dates shown for a course.
+EVENT_NAMES = frozenset(
+    [
+        "assignment_created",
+        "assignment_updated",
+        "assignment_override_created",
+        "assignment_override_updated",
+        "quiz_created",
+        "quiz_updated",
+        "quizzes.quiz_created",
+        "quizzes.quiz_updated",
+    ]
+)
+
+# Canvas global ids put the shard number above this many local ids.
+SHARD_SIZE = 10**13
+
+
+def sign(body, secret):
+    """
+    Return the hex HMAC-SHA256 signature of a request body.
+    """
+    if isinstance(secret, six.text_type):
+        secret = secret.encode("utf-8")
+    return hmac.new(secret, body, hashlib.sha256).hexdigest()
+
+
+def verify(body, secret, signature):
+    """
+    Check a body's signature. Any malformed signature is simply invalid.
+    """
+    if not signature:
+        return False
+
+    try:
+        if isinstance(signature, six.text_type):
+            signature = signature.encode("latin-1")
+        return hmac.compare_digest(sign(body, secret).encode("ascii"), signature)
+    except (TypeError, ValueError):
+        return False
+
+
+def part(event, name):
+    """
+    Return the ``metadata`` or ``body`` of an event, or ``{}`` if it is not
+    an object.
+    """
+    value = event.get(name)
+    return value if isinstance(value, dict) else {}
+
+
+def event_name(event):
+    return part(event, "metadata").get("event_name")
+
+
+def course_id(event):
+    """
+    Return the local id of the course an event belongs to, or ``None``.
+
+    The event body's context is used if it is a course, then the metadata's.
+    """
+    for context in (part(event, "body"), part(event, "metadata")):
+        if context.get("context_type") == "Course" and context.get("context_id"):
+            try:
+                return six.text_type(int(context["context_id"]) % SHARD_SIZE)
+            except (TypeError, ValueError):
+                return None
+    return None
+
+
+def make_event(name, course_id, **body):
+    """
+    Build a minimal Live Event in Canvas format.
+    """
+    body.update({"context_type": "Course", "context_id": six.text_type(course_id)})
+    return {
+        "metadata": {
+            "event_name": name,
+            "context_type": "Course",
+            "context_id": six.text_type(course_id),
+        },
+        "body": body,
+    }
+
+
+def send_event(url, secret, event):
+    """
+    Sign an event and post it to a ``/live_events`` endpoint.
+    """
+    import requests
+
+    body = json.dumps(event).encode("utf-8")
+    return requests.post(
+        url,
+        data=body,
+        headers={
+            "Content-Type": "application/json",
+            SIGNATURE_HEADER: sign(body, secret),
+        },
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("url", help="The app's /live_events URL.")
+    parser.add_argument("course_id", help="The course the event is for.")
+    parser.add_argument("--secret", required=True, help="LIVE_EVENTS_SECRET.")
+    parser.add_argument("--event", default="assignment_updated")
+    parser.add_argument("--assignment-id", default="1")
+    args = parser.parse_args()
+
+    event = make_event(args.event, args.course_id, assignment_id=args.assignment_id)
+    response = send_event(args.url, args.secret, event)
+    print(response.status_code, response.text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,509 @@
+"""
+Load test the Due Date Changer with many instructors at once.
+
+Each simulated instructor launches the tool with a signed LTI request, loads
+the assignment list and saves every row, the same as an instructor pressing
+Submit. Canvas is replaced by a local fake that answers every API call after
+a configurable delay.
+
+Run ``python loadtest.py --help`` for options. By default the app runs in
+this process, once per edit mode. Pass ``--app-url`` to test a deployed app
+instead. It must use the fake Canvas (see ``--canvas-port``) as its
+``CANVAS_URL``, list ``127.0.0.1`` in ``ALLOWED_CANVAS_DOMAINS``, and share
+the ``key``/``secret`` LTI consumer used by the tests.
+"""
+
+from __future__ import division, print_function
+
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+import json
+import math
+import random
+import re
+import threading
+import time
+import warnings
+
+import requests
+from six.moves.BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+from six.moves.socketserver import ThreadingMixIn
+from six.moves.urllib.parse import urlencode, urlparse
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+from launch import generate_launch_request
+import lti
+
+COURSE_ID = 1
+
+# Edit modes to compare, as EDIT_WORKERS values.
+MODES = {"sync": 1, "concurrent": 4}
+
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class FakeCanvas(object):
+    """
+    A Canvas API stand-in serving one course from memory.
+
+    Every fifth assignment is a quiz and every seventh has a section override.
+    Each response is delayed by ``latency`` seconds, plus up to ``jitter``
+    more.
+    """
+
+    def __init__(self, assignments=50, latency=0.05, jitter=0.0, port=0):
+        self.latency = latency
+        self.jitter = jitter
+
+        self.assignments = {}
+        self.quizzes = {}
+        self.groups = {}
+        for assignment_id in range(1, assignments + 1):
+            # Ten assignments per group, like one group per week.
+            group_id = (assignment_id + 9) // 10
+            self.groups[group_id] = {"id": group_id, "name": "Week {}".format(group_id)}
+            assignment = {
+                "id": assignment_id,
+                "course_id": COURSE_ID,
+                "assignment_group_id": group_id,
+                "name": "Assignment {}".format(assignment_id),
+                "published": True,
+                "unpublishable": True,
+                "due_at": "2020-01-31T23:59:00Z",
+                "updated_at": "2020-01-01T00:00:00Z",
+            }
+            if assignment_id % 5 == 0:
+                quiz_id = 1000 + assignment_id
+                assignment["quiz_id"] = quiz_id
+                self.quizzes[quiz_id] = {
+                    "id": quiz_id,
+                    "course_id": COURSE_ID,
+                    "title": assignment["name"],
+                }
+            if assignment_id % 7 == 0:
+                assignment["overrides"] = [
+                    {
+                        "id": 5000 + assignment_id,
+                        "assignment_id": assignment_id,
+                        "title": "Section 2",
+                        "due_at": "2020-02-07T23:59:00Z",
+                    }
+                ]
+            self.assignments[assignment_id] = assignment
+
+        self.routes = [
+            ("GET", r"/api/v1/users/self$", self.user),
+            ("GET", r"/api/v1/courses/(\d+)$", self.course),
+            ("GET", r"/api/v1/courses/\d+/assignment_groups$", self.group_list),
+            (
+                "GET",
+                r"/api/v1/courses/\d+/assignment_groups/(\d+)/assignments$",
+                self.group_assignment_list,
+            ),
+            ("GET", r"/api/v1/courses/\d+/assignments$", self.assignment_list),
+            ("PUT", r"/api/v1/courses/\d+/assignments/overrides$", self.overrides),
+            ("GET", r"/api/v1/courses/\d+/assignments/(\d+)$", self.assignment),
+            ("PUT", r"/api/v1/courses/\d+/assignments/(\d+)$", self.assignment),
+            ("GET", r"/api/v1/courses/\d+/quizzes$", self.quiz_list),
+            ("GET", r"/api/v1/courses/\d+/quizzes/(\d+)$", self.quiz),
+            ("PUT", r"/api/v1/courses/\d+/quizzes/(\d+)$", self.quiz),
+        ]
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_port)
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def respond(self, method, path):
+        time.sleep(self.latency + random.uniform(0, self.jitter))
+
+        for route_method, pattern, view in self.routes:
+            match = re.match(pattern, path)
+            if route_method == method and match:
+                return view(*match.groups())
+        return 404, {"errors": [{"message": "Not found"}]}
+
+    def user(self):
+        return 200, {"id": 1, "name": "Load Test"}
+
+    def course(self, course_id):
+        return 200, {"id": int(course_id), "name": "Load Test Course"}
+
+    def group_list(self):
+        return 200, list(self.groups.values())
+
+    def group_assignment_list(self, group_id):
+        return 200, [
+            assignment
+            for assignment in self.assignments.values()
+            if assignment["assignment_group_id"] == int(group_id)
+        ]
+
+    def assignment_list(self):
+        return 200, list(self.assignments.values())
+
+    def assignment(self, assignment_id):
+        assignment = self.assignments.get(int(assignment_id))
+        return (200, assignment) if assignment else (404, {})
+
+    def quiz_list(self):
+        return 200, list(self.quizzes.values())
+
+    def quiz(self, quiz_id):
+        quiz = self.quizzes.get(int(quiz_id))
+        return (200, quiz) if quiz else (404, {})
+
+    def overrides(self):
+        return 200, [
+            override
+            for assignment in self.assignments.values()
+            for override in assignment.get("overrides", [])
+        ]
+
+    def handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_method(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                self.rfile.read(length)
+
+                status, body = fake.respond(self.command, urlparse(self.path).path)
+                data = json.dumps(body).encode("utf-8")
+
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_PUT = handle_method
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class AppServer(object):
+    """
+    Serve a Due Date Changer app from a background thread.
+    """
+
+    def __init__(self, canvas_url, edit_workers):
+        app = lti.create_app()
+        app.config.update(
+            CANVAS_URL=canvas_url,
+            ALLOWED_CANVAS_DOMAINS=["127.0.0.1"],
+            EDIT_WORKERS=edit_workers,
+            # The test server is plain HTTP.
+            SESSION_COOKIE_SECURE=False,
+        )
+        self.server = make_server(
+            "127.0.0.1", 0, app, threaded=True, request_handler=QuietRequestHandler
+        )
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}".format(self.server.server_port)
+
+    def start(self):
+        thread = threading.Thread(target=self.server.serve_forever)
+        thread.daemon = True
+        thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def build_form(canvas):
+    """
+    Build the update form an instructor would submit for the fake course.
+    """
+    form = {}
+    for assignment_id, assignment in canvas.assignments.items():
+        prefix = "{}-".format(assignment_id)
+        form[prefix + "published"] = "on"
+        form[prefix + "due_at"] = "02/14/2020 11:59 PM"
+        if "quiz_id" in assignment:
+            form[prefix + "assignment_type"] = "quiz"
+            form[prefix + "quiz_id"] = str(assignment["quiz_id"])
+        else:
+            form[prefix + "assignment_type"] = "assignment"
+        for override in assignment.get("overrides", []):
+            form["{}override_{}_due_at".format(prefix, override["id"])] = (
+                "02/21/2020 11:59 PM"
+            )
+    return form
+
+
+def run_session(app_url, form):
+    """
+    Launch, view and save as one instructor.
+
+    :returns: A list of ``(step, seconds, ok)`` tuples.
+    """
+    session = requests.Session()
+    results = []
+
+    def timed(step, send, check, status_code=200):
+        start = time.time()
+        try:
+            response = send()
+            ok = response.status_code == status_code and check(response)
+        except requests.RequestException:
+            ok = False
+        results.append((step, time.time() - start, ok))
+        return ok
+
+    payload = {
+        "custom_canvas_course_id": str(COURSE_ID),
+        "custom_canvas_api_domain": "127.0.0.1",
+    }
+    headers = {"Content-Type": "application/x-www-form-urlencoded"}
+    launch_url = generate_launch_request(
+        "/launch",
+        body=urlencode(payload),
+        http_method="POST",
+        base_url=app_url,
+        headers=headers,
+    )
+    launched = timed(
+        "launch",
+        lambda: session.post(
+            app_url + launch_url, data=payload, headers=headers, allow_redirects=False
+        ),
+        lambda response: "/assignments" in response.headers.get("Location", ""),
+        status_code=302,
+    )
+    if not launched:
+        return results
+
+    timed(
+        "show_assignments",
+        lambda: session.get("{}/course/{}/assignments".format(app_url, COURSE_ID)),
+        lambda response: b"assignments_form" in response.content,
+    )
+
+    timed(
+        "update_assignments",
+        lambda: session.post(
+            "{}/course/{}/update".format(app_url, COURSE_ID),
+            data=form,
+            headers={"X-Ddc-Ajax": "true"},
+        ),
+        lambda response: not response.json()["error"],
+    )
+
+    return results
+
+
+def run_level(app_url, form, concurrency, sessions):
+    """
+    Run ``sessions`` instructor sessions, ``concurrency`` at a time.
+
+    :returns: The per-request results and the elapsed wall time.
+    """
+    start = time.time()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = [executor.submit(run_session, app_url, form) for _ in range(sessions)]
+        results = [result for future in futures for result in future.result()]
+    return results, time.time() - start
+
+
+def percentile(values, percent):
+    """
+    Nearest-rank percentile of a list of numbers.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = int(math.ceil(percent / 100 * len(values)))
+    return values[min(max(rank, 1), len(values)) - 1]
+
+
+def summarize(mode, concurrency, results, elapsed):
+    """
+    Reduce raw results to one report row per step, plus an ``all`` row.
+    """
+    rows = []
+    for step in ("all", "launch", "show_assignments", "update_assignments"):
+        selected = [r for r in results if step == "all" or r[0] == step]
+        latencies = [seconds for _, seconds, _ in selected]
+        errors = sum(1 for _, _, ok in selected if not ok)
+        rows.append(
+            {
+                "mode": mode,
+                "concurrency": concurrency,
+                "step": step,
+                "requests": len(selected),
+                "throughput": len(selected) / elapsed if elapsed else 0.0,
+                "p50": percentile(latencies, 50),
+                "p95": percentile(latencies, 95),
+                "p99": percentile(latencies, 99),
+                "error_rate": errors / len(selected) if selected else 0.0,
+            }
+        )
+    return rows
+
+
+def run(
+    levels=(1, 5, 10, 25),
+    sessions=None,
+    assignments=50,
+    latency=0.05,
+    jitter=0.0,
+    modes=tuple(MODES),
+    app_url=None,
+    canvas_port=0,
+):
+    """
+    Run the load test and return report rows.
+
+    :param levels: Concurrent instructor counts to step through.
+    :param sessions: Sessions per level. Defaults to twice the concurrency.
+    :param app_url: A running app to test instead of starting one per mode.
+    """
+    # The fake Canvas is plain HTTP.
+    warnings.filterwarnings("ignore", "Canvas may respond unexpectedly")
+
+    canvas = FakeCanvas(assignments, latency, jitter, canvas_port)
+    canvas.start()
+    form = build_form(canvas)
+
+    rows = []
+    try:
+        for mode in ["external"] if app_url else modes:
+            server = None
+            url = app_url
+            if not app_url:
+                server = AppServer(canvas.url, MODES[mode])
+                server.start()
+                url = server.url
+
+            try:
+                for concurrency in levels:
+                    results, elapsed = run_level(
+                        url, form, concurrency, sessions or concurrency * 2
+                    )
+                    rows.extend(summarize(mode, concurrency, results, elapsed))
+            finally:
+                if server:
+                    server.stop()
+    finally:
+        canvas.stop()
+
+    return rows
+
+
+def print_report(rows):
+    header = "{:<10} {:>5} {:<20} {:>8} {:>9} {:>8} {:>8} {:>8} {:>7}"
+    line = "{:<10} {:>5} {:<20} {:>8} {:>9.1f} {:>8.3f} {:>8.3f} {:>8.3f} {:>6.1%}"
+    print(
+        header.format(
+            "mode",
+            "conc",
+            "step",
+            "requests",
+            "req/s",
+            "p50 s",
+            "p95 s",
+            "p99 s",
+            "errors",
+        )
+    )
+    for row in rows:
+        print(
+            line.format(
+                row["mode"],
+                row["concurrency"],
+                row["step"],
+                row["requests"],
+                row["throughput"],
+                row["p50"],
+                row["p95"],
+                row["p99"],
+                row["error_rate"],
+            )
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--levels",
+        default="1,5,10,25",
+        help="comma-separated concurrent instructor counts (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--sessions", type=int, help="sessions per level (default: 2 x concurrency)"
+    )
+    parser.add_argument(
+        "--assignments",
+        type=int,
+        default=50,
+        help="assignments in the fake course (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.05,
+        help="seconds added to every Canvas call (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="up to this many more random seconds per call (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--modes",
+        default=",".join(MODES),
+        help="edit modes to compare: {} (default: %(default)s)".format(
+            ", ".join(MODES)
+        ),
+    )
+    parser.add_argument("--app-url", help="test a running app instead")
+    parser.add_argument(
+        "--canvas-port", type=int, default=0, help="port for the fake Canvas"
+    )
+    parser.add_argument("--json", action="store_true", help="print rows as JSON")
+    args = parser.parse_args()
+
+    rows = run(
+        levels=[int(level) for level in args.levels.split(",")],
+        sessions=args.sessions,
+        assignments=args.assignments,
+        latency=args.latency,
+        jitter=args.jitter,
+        modes=args.modes.split(","),
+        app_url=args.app_url,
+        canvas_port=args.canvas_port,
+    )
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print_report(rows)
+
+
+if __name__ == "__main__":
+    main()
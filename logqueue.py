@@ -0,0 +1,170 @@
+import atexit
+import copy
+import json
+import logging
+import os
+import threading
+
+from six.moves import queue
+
+try:  # pragma: no cover
+    from logging.handlers import QueueHandler, QueueListener  # py3
+except ImportError:  # pragma: no cover
+    QueueHandler = QueueListener = None  # py2
+
+
+class JSONFormatter(logging.Formatter):
+    """
+    Format each record as a single line of JSON.
+    """
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "file": record.filename,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exception"] = record.exc_text
+
+        return json.dumps(data)
+
+
+if QueueHandler is not None:
+
+    class BufferedQueueHandler(QueueHandler):
+        """
+        Hand records to a background thread through a bounded queue.
+
+        Emitting a record only formats its message and puts it on the queue,
+        so callers never wait on disk I/O. When the queue is full the record
+        is dropped and counted, and the listener logs a warning with the
+        count once it catches up.
+
+        The queue and listener thread are created on the first record in
+        each process, so forked workers never share them.
+        """
+
+        def __init__(self, handlers, maxsize):
+            """
+            :param handlers: The handlers the listener thread writes to.
+            :param maxsize: The most records to buffer before dropping.
+            """
+            QueueHandler.__init__(self, None)
+            self.handlers = handlers
+            self.maxsize = maxsize
+            self.listener = None
+            self.dropped = 0
+            self._pid = None
+            self._lock = threading.Lock()
+            atexit.register(self.stop)
+
+        def start(self):
+            """
+            Start this process's listener thread if it is not running.
+            """
+            pid = os.getpid()
+            if self._pid == pid:
+                return
+
+            with self._lock:
+                if self._pid == pid:
+                    return
+
+                self.queue = queue.Queue(self.maxsize)
+                self.dropped = 0
+                self.listener = ReportingQueueListener(self, self.handlers)
+                self.listener.start()
+                self._pid = pid
+
+        def stop(self):
+            """
+            Write out any buffered records and stop the listener thread.
+            """
+            with self._lock:
+                if self._pid != os.getpid():
+                    return
+
+                self.listener.stop()
+                self._pid = None
+
+        def close(self):
+            self.stop()
+            for handler in self.handlers:
+                handler.close()
+            QueueHandler.close(self)
+
+        def prepare(self, record):
+            # Render the message and traceback now, while the arguments and
+            # exception are still current, but leave the final formatting to
+            # the target handlers.
+            record = copy.copy(record)
+            record.msg = record.getMessage()
+            record.args = None
+            if record.exc_info:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+                record.exc_info = None
+            return record
+
+        def enqueue(self, record):
+            self.start()
+            try:
+                self.queue.put_nowait(record)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+
+        def stats(self):
+            if self._pid != os.getpid():
+                # Nothing logged in this process yet. Any queue is a copy of
+                # the parent's from before the fork.
+                return {"queued": 0, "capacity": self.maxsize, "dropped": 0}
+
+            return {
+                "queued": self.queue.qsize(),
+                "capacity": self.maxsize,
+                "dropped": self.dropped,
+            }
+
+    class ReportingQueueListener(QueueListener):
+        """
+        A queue listener that logs a warning when records were dropped.
+        """
+
+        def __init__(self, owner, handlers):
+            QueueListener.__init__(
+                self, owner.queue, *handlers, respect_handler_level=True
+            )
+            self.owner = owner
+            self.reported = 0
+
+        def enqueue_sentinel(self):
+            # Wait for room rather than failing when the queue is full.
+            self.queue.put(self._sentinel)
+
+        def handle(self, record):
+            dropped = self.owner.dropped
+            if dropped > self.reported:
+                QueueListener.handle(
+                    self,
+                    logging.makeLogRecord(
+                        {
+                            "name": record.name,
+                            "levelno": logging.WARNING,
+                            "levelname": "WARNING",
+                            "msg": "Log queue was full. Dropped {} records.".format(
+                                dropped - self.reported
+                            ),
+                        }
+                    ),
+                )
+                self.reported = dropped
+
+            QueueListener.handle(self, record)
@@ -1,51 +1,232 @@
-from collections import defaultdict
-from datetime import datetime
+from collections import defaultdict, namedtuple
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from datetime import datetime, timedelta
+import functools
+import itertools
 import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import RotatingFileHandler, WatchedFileHandler
+import os
 import re
+import threading
+import time
 
-from flask import Flask, redirect, render_template, request, url_for, Response
-from canvasapi import Canvas
-from canvasapi.user import User
-from canvasapi.exceptions import CanvasException
-from pylti.flask import lti
+from flask import (
+    Blueprint,
+    Flask,
+    Response,
+    current_app,
+    has_request_context,
+    redirect,
+    render_template,
+    request,
+    send_file,
+    session,
+    stream_with_context,
+    url_for,
+)
 from pytz import utc, timezone
-import requests
 import six
 
-from config import (
-    ALLOWED_CANVAS_DOMAINS,
-    API_KEY,
-    CANVAS_URL,
-    GOOGLE_ANALYTICS,
-    LOCAL_TIME_FORMAT,
-    LOG_BACKUP_COUNT,
-    LOG_FORMAT,
-    LOG_FILE,
-    LOG_LEVEL,
-    LOG_MAX_BYTES,
-    TIME_ZONE,
-)
+from cache import CourseCache, LRUCache
+from compression import compress_response
+from health import CachedCheck
+import liveevents
+import logqueue
+from profiling import RequestProfiler, app_store
+import schedule
 
-app = Flask(__name__)
-app.config.from_object("config")
+bp = Blueprint("ddc", __name__)
 
-formatter = logging.Formatter(LOG_FORMAT)
-handler = RotatingFileHandler(
-    LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT
-)
-handler.setLevel(logging.getLevelName(LOG_LEVEL))
-handler.setFormatter(formatter)
-app.logger.addHandler(handler)
+# Settings that older config files may not define.
+DEFAULT_CONFIG = {
+    "STATUS_API_CHECK_TTL": 300,
+    "FRAGMENT_CACHE_SIZE": 5000,
+    "COMPRESS_MIMETYPES": ["text/html", "application/json", "application/xml"],
+    "COMPRESS_MIN_SIZE": 500,
+    "COMPRESS_LEVEL": 6,
+    "COMPRESS_BROTLI_QUALITY": 4,
+    "EDIT_WORKERS": 4,
+    "OVERRIDE_BATCH_SIZE": 50,
+    "LOG_QUEUE_SIZE": 10000,
+    "LOG_JSON": False,
+    "LOG_ROTATION": "size",
+    "CANVAS_DOMAINS": {},
+    "CANVAS_POOL_SIZE": 10,
+    "CANVAS_MAX_CONCURRENT": 10,
+    "CANVAS_RATE_LIMIT": 0,
+    "CANVAS_RATE_BURST": 10,
+    "CANVAS_BUSY_TIMEOUT": 10,
+    "COURSE_CACHE_TTL": 0,
+    "COURSE_CACHE_SIZE": 200,
+    "COURSE_CACHE_DIR": None,
+    "LIVE_EVENTS_SECRET": None,
+    "QUIZ_LOOKUP_LIMIT": 20,
+    "PROFILE_ALL": False,
+    "PROFILE_SAMPLE_RATE": 0,
+    "PROFILE_SLOW_SECONDS": None,
+    "PROFILE_INTERVAL": 0.005,
+    "PROFILE_DIR": "profiles",
+    "PROFILE_KEEP": 50,
+    "PROFILE_ADMIN_ROLES": [
+        "Administrator",
+        "urn:lti:instrole:ims/lis/Administrator",
+        "urn:lti:sysrole:ims/lis/SysAdmin",
+    ],
+}
+
+# Dates an assignment override can set for its section, group or students.
+OVERRIDE_FIELDS = ["due_at", "unlock_at", "lock_at"]
+
+# Limits the assignments shown to one assignment group, a window of due
+# dates ("YYYY-MM-DD", inclusive) or names containing a search term.
+Scope = namedtuple("Scope", ["group", "start", "end", "search"])
+ALL_ASSIGNMENTS = Scope(None, None, None, None)
+
+
+def create_app(config="config"):
+    """
+    Build the Due Date Changer application.
+
+    Nothing expensive happens here. The Canvas client, the log file and the
+    canvasapi/pylti imports are all deferred until a request needs them, so
+    workers start quickly and every forked process builds its own clients.
+
+    :param config: An import path or object to load configuration from.
+    """
+    app = Flask(__name__)
+    app.config.update(DEFAULT_CONFIG)
+    app.config.from_object(config)
+    app.extensions["ddc"] = {
+        "lock": threading.Lock(),
+        "api_key_check": CachedCheck(
+            functools.partial(check_api_key, app),
+            app.config["STATUS_API_CHECK_TTL"],
+        ),
+        "fragments": LRUCache(app.config["FRAGMENT_CACHE_SIZE"]),
+        "courses": CourseCache(
+            app.config["COURSE_CACHE_TTL"],
+            app.config["COURSE_CACHE_SIZE"],
+            app.config["COURSE_CACHE_DIR"],
+        ),
+    }
+
+    add_log_handler(app)
+    app.register_blueprint(bp)
+    app.wsgi_app = RequestProfiler(app, app.wsgi_app)
 
+    return app
+
+
+def add_log_handler(app):
+    """
+    Attach the log file handler to the app's logger.
+
+    Records go through a ``BufferedQueueHandler`` so requests never wait on
+    disk writes or rotation. Set ``LOG_QUEUE_SIZE`` to 0 to write directly.
+    The file is not opened until the first record is written. Handlers left
+    by a previous call on the same logger are replaced rather than stacked.
+    """
+    for existing in list(app.logger.handlers):
+        if getattr(existing, "ddc_handler", False):
+            app.logger.removeHandler(existing)
+            existing.close()
 
-canvas = Canvas(CANVAS_URL, API_KEY)
+    if app.config["LOG_ROTATION"] == "external":
+        # Leave rotation to logrotate, which is safe with many workers.
+        handler = WatchedFileHandler(app.config["LOG_FILE"], delay=True)
+    else:
+        handler = RotatingFileHandler(
+            app.config["LOG_FILE"],
+            maxBytes=app.config["LOG_MAX_BYTES"],
+            backupCount=app.config["LOG_BACKUP_COUNT"],
+            delay=True,
+        )
+    level = logging.getLevelName(app.config["LOG_LEVEL"])
+    handler.setLevel(level)
+    if app.config["LOG_JSON"]:
+        handler.setFormatter(logqueue.JSONFormatter())
+    else:
+        handler.setFormatter(logging.Formatter(app.config["LOG_FORMAT"]))
+
+    if app.config["LOG_QUEUE_SIZE"] > 0 and logqueue.QueueHandler is not None:
+        handler = logqueue.BufferedQueueHandler([handler], app.config["LOG_QUEUE_SIZE"])
+        handler.setLevel(level)
+        app.extensions["ddc"]["log_queue"] = handler
+
+    handler.ddc_handler = True
+    app.logger.addHandler(handler)
+
+
+def get_canvas():
+    """
+    Return the Canvas client for the current session's Canvas domain.
+    """
+    return get_clients().get(current_domain())
+
+
+def get_clients():
+    """
+    Return the current process's ``ClientRegistry``, creating it on first use.
+
+    The registry is keyed on the process id so that a worker forked from a
+    parent that already made requests never shares its connection pools.
+    """
+    state = current_app.extensions["ddc"]
+    pid = os.getpid()
+
+    if state.get("clients_pid") != pid:
+        with state["lock"]:
+            if state.get("clients_pid") != pid:
+                from clients import ClientRegistry
+
+                state["clients"] = ClientRegistry(current_app.config)
+                state["clients_pid"] = pid
+
+    return state["clients"]
+
+
+def current_domain():
+    """
+    Return the Canvas domain recorded at launch, or ``None`` outside a request.
+    """
+    if not has_request_context():
+        return None
+    return session.get("canvas_domain")
 
 
-@app.context_processor
+def lti_required(request="any", role="any"):
+    """
+    Protect a view with pylti's ``lti`` decorator.
+
+    pylti is imported on the first call to the view rather than at module
+    load, and uses ``current_app`` so the view works with any app instance.
+    """
+
+    def decorator(view):
+        protected = []
+
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            if not protected:
+                from pylti.flask import lti
+
+                protected.append(lti(error=error, request=request, role=role)(view))
+            return protected[0](*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+@bp.after_app_request
+def compress(response):
+    return compress_response(response, request.accept_encodings, current_app.config)
+
+
+@bp.app_context_processor
 def add_google_analytics_id():
-    return dict(GOOGLE_ANALYTICS=GOOGLE_ANALYTICS)
+    return dict(GOOGLE_ANALYTICS=current_app.config["GOOGLE_ANALYTICS"])
 
 
 def error(exception=None):
@@ -59,150 +240,405 @@ def error(exception=None):
     )
 
 
-@app.route("/launch", methods=["GET", "POST"])
-@lti(error=error, request="initial", role="staff", app=app)
-def launch(lti=lti):
+@bp.route("/launch", methods=["GET", "POST"])
+@lti_required(request="initial", role="staff")
+def launch(lti=None):
+    allowed_domains = current_app.config["ALLOWED_CANVAS_DOMAINS"]
     canvas_domain = request.values.get("custom_canvas_api_domain")
-    if canvas_domain not in ALLOWED_CANVAS_DOMAINS:
+    if canvas_domain not in allowed_domains:
         msg = (
             "<p>This tool is only available from the following domain(s):<br/>{}</p>"
             "<p>You attempted to access from this domain:<br/>{}</p>"
         )
         return render_template(
             "error.htm.j2",
-            message=msg.format(", ".join(ALLOWED_CANVAS_DOMAINS), canvas_domain),
+            message=msg.format(", ".join(allowed_domains), canvas_domain),
         )
 
     course_id = request.form.get("custom_canvas_course_id")
+    session["canvas_domain"] = canvas_domain
 
-    return redirect(url_for("show_assignments", course_id=course_id))
+    return redirect(url_for(".show_assignments", course_id=course_id))
 
 
-@app.route("/", methods=["GET"])
-def index(lti=lti):
+@bp.route("/", methods=["GET"])
+def index():
     return "Please contact your System Administrator."
 
 
-@app.route("/status", methods=["GET"])
-def status():  # pragma: no cover
+@bp.route("/status/live", methods=["GET"])
+def status_live():
+    """
+    Liveness probe. Answers from this process alone, without touching Canvas.
+    """
+    return Response(
+        json.dumps({"tool": "Due Date Changer", "alive": True, "pid": os.getpid()}),
+        mimetype="application/json",
+    )
+
+
+@bp.route("/status", methods=["GET"])
+def status():
     """
     Runs smoke tests and reports status
     """
+    return Response(json.dumps(get_status()), mimetype="application/json")
+
+
+@bp.route("/status/ready", methods=["GET"])
+def status_ready():
+    """
+    Readiness probe. Same report as ``/status``, with a 503 when unhealthy.
+    """
+    status = get_status()
+
+    return Response(
+        json.dumps(status),
+        status=200 if status["healthy"] else 503,
+        mimetype="application/json",
+    )
+
+
+def get_status():
+    """
+    Build the status report without making any network calls.
+
+    The index and XML checks run in-process. The API key check reads the
+    result cached by ``api_key_check``, which is refreshed in the background
+    at most once every ``STATUS_API_CHECK_TTL`` seconds.
+    """
     status = {
         "tool": "Due Date Changer",
         "checks": {"index": False, "xml": False, "api_key": False},
-        "url": url_for("index", _external=True),
-        "xml_url": url_for("xml", _external=True),
-        "canvas_url": CANVAS_URL,
-        "debug": app.debug,
+        "url": url_for(".index", _external=True),
+        "xml_url": url_for(".xml", _external=True),
+        "canvas_url": current_app.config["CANVAS_URL"],
+        "debug": current_app.debug,
     }
 
     # Check index
     try:
-        response = requests.get(url_for("index", _external=True), verify=False)
         status["checks"]["index"] = (
-            response.text == "Please contact your System Administrator."
+            index() == "Please contact your System Administrator."
         )
     except Exception:
-        app.logger.exception("Index check failed.")
+        current_app.logger.exception("Index check failed.")
 
     # Check xml
     try:
-        response = requests.get(url_for("xml", _external=True), verify=False)
-        status["checks"]["xml"] = "application/xml" in response.headers.get(
-            "Content-Type"
-        )
+        current_app.jinja_env.get_template("lti.xml.j2")
+        status["checks"]["xml"] = True
     except Exception:
-        app.logger.exception("XML check failed.")
+        current_app.logger.exception("XML check failed.")
 
     # Check API Key
-    try:
-        self_user = canvas.get_user("self")
-        status["checks"]["api_key"] = isinstance(self_user, User)
-    except Exception:
-        app.logger.exception("API check failed.")
+    api_key, checked_at = current_app.extensions["ddc"]["api_key_check"].result()
+    status["checks"]["api_key"] = api_key is True
+    status["api_key_checked_at"] = checked_at
 
     # Overall health check - if all checks are True
     status["healthy"] = all(v is True for k, v in status["checks"].items())
 
-    return Response(json.dumps(status), mimetype="application/json")
+    log_queue = current_app.extensions["ddc"].get("log_queue")
+    if log_queue is not None:
+        status["logging"] = log_queue.stats()
+
+    return status
 
 
-@app.route("/course/<course_id>/assignments", methods=["GET"])
-@lti(error=error, request="session", role="staff", app=app)
-def show_assignments(course_id, lti=lti):
+def check_api_key(app):
+    """
+    Confirm the configured API key can fetch its own Canvas user.
+    """
+    from canvasapi.user import User
+
+    with app.app_context():
+        try:
+            return isinstance(get_canvas().get_user("self"), User)
+        except Exception:
+            app.logger.exception("API check failed.")
+            return False
+
+
+@bp.route("/course/<course_id>/assignments", methods=["GET"])
+@lti_required(request="session", role="staff")
+def show_assignments(course_id, lti=None):
+    from canvasapi.exceptions import CanvasException
+
+    scope = parse_scope(request.args)
     try:
-        course = canvas.get_course(course_id)
-        assignments = course.get_assignments()
-        quiz_dict = {quiz.id: quiz for quiz in course.get_quizzes()}
+        course, assignments, quiz_dict, groups = load_course(course_id, scope)
     except CanvasException as err:
-        app.logger.exception(
+        current_app.logger.exception(
             "Error getting course, assignments or quizzes from Canvas."
         )
+        if is_ajax_request(request):
+            # Let the page reload into the full error page.
+            return Response(status=502)
         return error({"exception": err})
 
     assignment_quiz_list = []
-    try:
-        for assignment in assignments:
-            if hasattr(assignment, "quiz_id"):
-                quiz = quiz_dict.get(assignment.quiz_id)
-                if hasattr(quiz, "show_correct_answers_at_date"):
-                    assignment.show_correct_answers_at_date = datetime_localize(
-                        quiz.show_correct_answers_at_date
-                    )
-                if hasattr(quiz, "hide_correct_answers_at_date"):
-                    assignment.hide_correct_answers_at_date = datetime_localize(
-                        quiz.hide_correct_answers_at_date
-                    )
-            assignment_quiz_list.append(assignment)
-    except CanvasException as err:
-        app.logger.exception("Error getting assignments from Canvas.")
-        return error({"exception": err})
+    for assignment in assignments:
+        if hasattr(assignment, "quiz_id"):
+            quiz = quiz_dict.get(assignment.quiz_id)
+            if hasattr(quiz, "show_correct_answers_at_date"):
+                assignment.show_correct_answers_at_date = datetime_localize(
+                    quiz.show_correct_answers_at_date
+                )
+            if hasattr(quiz, "hide_correct_answers_at_date"):
+                assignment.hide_correct_answers_at_date = datetime_localize(
+                    quiz.hide_correct_answers_at_date
+                )
+        assignment.override_rows = override_rows(assignment)
+        assignment_quiz_list.append(assignment)
+
+    rows = [
+        render_assignment_row(course, assignment) for assignment in assignment_quiz_list
+    ]
+
+    if is_ajax_request(request):
+        # Switching scope only replaces the rows.
+        return render_template("assignment_rows.htm.j2", rows=rows)
 
     return render_template(
-        "assignments.htm.j2", assignments=assignment_quiz_list, course=course
+        "assignments.htm.j2",
+        assignments=assignment_quiz_list,
+        rows=rows,
+        course=course,
+        groups=groups,
+        scope=scope,
     )
 
 
-@app.route("/course/<course_id>/update", methods=["POST"])
-@lti(error=error, request="session", role="staff", app=app)
-def update_assignments(course_id, lti=lti):
-    def fix_date(value):
+def parse_scope(args):
+    """
+    Read a ``Scope`` from the query string, ignoring any invalid parts.
+    """
+    group = args.get("group", "").strip()
+    dates = []
+    for name in ("start", "end"):
+        value = args.get(name, "").strip()
         try:
-            value = datetime.strptime(value, LOCAL_TIME_FORMAT)
-            value = local_tz.localize(value)
-            return value.isoformat()
-        except (ValueError, TypeError):
-            # Not a valid time. Just ignore.
-            return ""
-
-    def error_json(assignment_id, updated_list):
-        msg = "There was an error editing one of the assignments. (ID: {})"
-        msg = msg.format(assignment_id)
-        if len(updated_list) > 0:
-            "{} {} assignments have been updated successfully.".format(
-                msg, len(updated_list)
+            datetime.strptime(value, "%Y-%m-%d")
+        except ValueError:
+            value = None
+        dates.append(value)
+    search = args.get("search", "").strip()
+
+    return Scope(group if group.isdigit() else None, dates[0], dates[1], search or None)
+
+
+def load_course(course_id, scope=ALL_ASSIGNMENTS):
+    """
+    Return a course with the assignments and quizzes in ``scope``, and its
+    assignment groups.
+
+    An assignment group scope is fetched from that group's listing and a
+    search is passed on to Canvas, so only matching assignments are sent.
+    The due date window is applied here. Only the quizzes of the returned
+    assignments are looked up.
+
+    Results without a search are kept in the course cache for
+    ``COURSE_CACHE_TTL`` seconds, or until an edit or Live Event for the
+    course invalidates them.
+    """
+    courses = current_app.extensions["ddc"]["courses"]
+    key = (get_clients().url(current_domain()), scope)
+
+    data = courses.get(key, course_id)
+    if data is None:
+        fetched_at = time.time()
+        course = get_canvas().get_course(course_id)
+        groups = list(course.get_assignment_groups())
+
+        # Overrides come back with each assignment rather than one call each.
+        kwargs = {"include": ["overrides"]}
+        if scope.search and len(scope.search) > 1:
+            # Canvas ignores shorter search terms.
+            kwargs["search_term"] = scope.search
+        if scope.group:
+            assignments = course.get_assignments_for_group(scope.group, **kwargs)
+        else:
+            assignments = course.get_assignments(**kwargs)
+        assignments = [
+            assignment for assignment in assignments if in_scope(assignment, scope)
+        ]
+
+        quiz_ids = {
+            assignment.quiz_id
+            for assignment in assignments
+            if hasattr(assignment, "quiz_id")
+        }
+        data = (course, assignments, get_quizzes(course, quiz_ids, scope), groups)
+        if not scope.search:
+            courses.set(key, course_id, data, fetched_at)
+
+    return data
+
+
+def in_scope(assignment, scope):
+    """
+    Check an assignment against a scope's search term and due date window.
+
+    An assignment is in the window if it or any of its overrides is due in
+    it. Dates are compared in ``TIME_ZONE``.
+    """
+    if scope.search:
+        if scope.search.lower() not in getattr(assignment, "name", "").lower():
+            return False
+
+    if not (scope.start or scope.end):
+        return True
+
+    local_tz = timezone(current_app.config["TIME_ZONE"])
+    start = end = None
+    if scope.start:
+        start = local_tz.localize(datetime.strptime(scope.start, "%Y-%m-%d"))
+    if scope.end:
+        end = local_tz.localize(datetime.strptime(scope.end, "%Y-%m-%d"))
+        end += timedelta(days=1)
+
+    due_dates = [getattr(assignment, "due_at_date", None)] + [
+        getattr(override, "due_at_date", None)
+        for override in getattr(assignment, "overrides", None) or []
+    ]
+    return any(
+        due is not None
+        and (start is None or due >= start)
+        and (end is None or due < end)
+        for due in due_dates
+    )
+
+
+def get_quizzes(course, quiz_ids, scope):
+    """
+    Return the quizzes with the given ids, keyed on id.
+
+    A scoped page usually needs only a few quizzes, so up to
+    ``QUIZ_LOOKUP_LIMIT`` of them are fetched one by one, ``EDIT_WORKERS`` at
+    a time. Otherwise every quiz in the course is listed. Quizzes Canvas
+    can't find are left out either way.
+    """
+    if not quiz_ids:
+        return {}
+
+    workers = current_app.config["EDIT_WORKERS"]
+    if (
+        scope == ALL_ASSIGNMENTS
+        or len(quiz_ids) > current_app.config["QUIZ_LOOKUP_LIMIT"]
+    ):
+        quizzes = course.get_quizzes()
+    elif workers <= 1:
+        quizzes = [get_quiz_or_none(course, quiz_id) for quiz_id in quiz_ids]
+    else:
+        with ThreadPoolExecutor(max_workers=min(workers, len(quiz_ids))) as executor:
+            quizzes = list(
+                executor.map(functools.partial(get_quiz_or_none, course), quiz_ids)
             )
 
-        return Response(
-            json.dumps({"error": True, "message": msg, "updated": updated_list}),
-            mimetype="application/json",
+    return {
+        quiz.id: quiz for quiz in quizzes if quiz is not None and quiz.id in quiz_ids
+    }
+
+
+def get_quiz_or_none(course, quiz_id):
+    """
+    Fetch a quiz, or return ``None`` if it was deleted, as the full quiz list
+    would leave it out.
+    """
+    from canvasapi.exceptions import ResourceDoesNotExist
+
+    try:
+        return course.get_quiz(quiz_id)
+    except ResourceDoesNotExist:
+        return None
+
+
+def override_rows(assignment):
+    """
+    Summarize an assignment's overrides for display.
+
+    Only the dates an override actually overrides are listed, since Canvas
+    clears any overridden date that is left out when the override is saved.
+    """
+    return [
+        {
+            "id": override.id,
+            "title": getattr(override, "title", ""),
+            "dates": [
+                (
+                    field,
+                    localize_or_blank(getattr(override, field + "_date", None)),
+                )
+                for field in OVERRIDE_FIELDS
+                if hasattr(override, field)
+            ],
+        }
+        for override in getattr(assignment, "overrides", None) or []
+    ]
+
+
+def render_assignment_row(course, assignment):
+    """
+    Render one assignment's row of the form.
+
+    Rows are cached on the Canvas URL, the assignment's id and
+    ``updated_at``, along with the few values Canvas can change without
+    touching ``updated_at``, such as override titles that follow section
+    names, so an unchanged assignment is never rendered twice.
+    """
+    canvas_url = get_clients().url(current_domain())
+    updated_at = getattr(assignment, "updated_at", None)
+    if updated_at is None:
+        return render_template(
+            "assignment_row.htm.j2",
+            assignment=assignment,
+            course=course,
+            canvas_url=canvas_url,
         )
 
-    def is_ajax_request(request):
-        """
-        Determine whether or not a request was made via AJAX.
-        """
-        return request.headers.get("X-Ddc-Ajax", "").lower() == "true"
+    key = (
+        canvas_url,
+        course.id,
+        assignment.id,
+        updated_at,
+        getattr(assignment, "published", None),
+        getattr(assignment, "unpublishable", None),
+        getattr(assignment, "show_correct_answers_at_date", None),
+        getattr(assignment, "hide_correct_answers_at_date", None),
+        tuple(
+            (override["id"], override["title"], tuple(override["dates"]))
+            for override in assignment.override_rows
+        ),
+    )
+    fragments = current_app.extensions["ddc"]["fragments"]
+
+    row = fragments.get(key)
+    if row is None:
+        row = render_template(
+            "assignment_row.htm.j2",
+            assignment=assignment,
+            course=course,
+            canvas_url=canvas_url,
+        )
+        fragments.set(key, row)
+
+    return row
+
+
+@bp.route("/course/<course_id>/update", methods=["POST"])
+@lti_required(request="session", role="staff")
+def update_assignments(course_id, lti=None):
+    from canvasapi.exceptions import CanvasException
 
     if not is_ajax_request(request):
         return render_template("error.htm.j2", message="Non-AJAX requests not allowed.")
 
     try:
-        course = canvas.get_course(course_id)
+        course = get_canvas().get_course(course_id)
     except CanvasException:
         msg = "Error getting course #{}.".format(course_id)
-        app.logger.exception(msg)
+        current_app.logger.exception(msg)
         return Response(
             json.dumps({"error": True, "message": msg, "updated": []}),
             mimetype="application/json",
@@ -210,15 +646,19 @@ def update_assignments(course_id, lti=lti):
 
     post_data = request.form
 
-    local_tz = timezone(TIME_ZONE)
     assignment_field_map = defaultdict(dict)
 
     for key, value in six.iteritems(post_data):
-        if not re.match(r"\d+-[a-z_]+", key):
+        match = re.match(r"^(\d+)-(?:override_(\d+)_)?([a-z_]+)$", key)
+        if not match:
             continue
 
-        assignment_id, field_name = key.split("-")
-        assignment_field_map[assignment_id].update({field_name: value})
+        assignment_id, override_id, field_name = match.groups()
+        if override_id:
+            overrides = assignment_field_map[assignment_id].setdefault("overrides", {})
+            overrides.setdefault(override_id, {})[field_name] = value
+        else:
+            assignment_field_map[assignment_id].update({field_name: value})
 
     if len(assignment_field_map) < 1:
         return Response(
@@ -232,7 +672,24 @@ def update_assignments(course_id, lti=lti):
             mimetype="application/json",
         )
 
-    updated_list = []
+    return edit_assignments(course, assignment_field_map)
+
+
+def edit_assignments(course, assignment_field_map):
+    """
+    Save new dates and published states to Canvas.
+
+    Each assignment or quiz is edited separately, and override changes are
+    sent in batches. Up to ``EDIT_WORKERS`` of these edits run at once.
+
+    :param course: The course the assignments belong to.
+    :param assignment_field_map: Maps each assignment id to a dict of the
+        form fields submitted for it (``due_at``, ``published``, ...), with
+        override fields under ``overrides``, keyed by override id.
+    :returns: The JSON response reporting what was updated.
+    """
+    tasks = []
+    override_list = []
     for assignment_id, field in six.iteritems(assignment_field_map):
         assignment_type = field.get("assignment_type", "assignment")
         quiz_id = field.get("quiz_id")
@@ -256,34 +713,49 @@ def update_assignments(course_id, lti=lti):
                 }
             )
 
-            try:
-                quiz = course.get_quiz(quiz_id)
-                quiz.edit(quiz=payload)
-                updated_list.append(
-                    {"id": assignment_id, "title": quiz.title, "type": "Quiz"}
+            tasks.append(
+                (
+                    assignment_id,
+                    functools.partial(
+                        edit_quiz, course, quiz_id, assignment_id, payload
+                    ),
+                    "Error getting/editing quiz #{}.".format(quiz_id),
                 )
-            except CanvasException:
-                app.logger.exception("Error getting/editing quiz #{}.".format(quiz_id))
-
-                return error_json(assignment_id, updated_list)
+            )
 
         else:
-            try:
-                assignment = course.get_assignment(assignment_id)
-                assignment.edit(assignment=payload)
-                updated_list.append(
-                    {
-                        "id": assignment_id,
-                        "title": assignment.name,
-                        "type": "Assignment",
-                    }
-                )
-            except CanvasException:
-                app.logger.exception(
-                    "Error getting/editing assignment #{}.".format(assignment_id)
+            tasks.append(
+                (
+                    assignment_id,
+                    functools.partial(edit_assignment, course, assignment_id, payload),
+                    "Error getting/editing assignment #{}.".format(assignment_id),
                 )
+            )
 
-                return error_json(assignment_id, updated_list)
+        for override_id, override_field in six.iteritems(field.get("overrides", {})):
+            override = {"id": int(override_id), "assignment_id": int(assignment_id)}
+            for field_name in OVERRIDE_FIELDS:
+                if field_name in override_field:
+                    override[field_name] = fix_date(override_field[field_name])
+            override_list.append(override)
+
+    batch_size = current_app.config["OVERRIDE_BATCH_SIZE"]
+    for start in range(0, len(override_list), batch_size):
+        batch = override_list[start : start + batch_size]
+        tasks.append(
+            (
+                six.text_type(batch[0]["assignment_id"]),
+                functools.partial(edit_overrides, course, batch),
+                "Error editing overrides for assignments {}.".format(
+                    ", ".join(sorted({str(o["assignment_id"]) for o in batch}))
+                ),
+            )
+        )
+
+    updated_list, failed_id = run_edits(tasks, current_app.config["EDIT_WORKERS"])
+    current_app.extensions["ddc"]["courses"].invalidate(course.id)
+    if failed_id is not None:
+        return error_json(failed_id, updated_list)
 
     return Response(
         json.dumps(
@@ -299,18 +771,341 @@ def update_assignments(course_id, lti=lti):
     )
 
 
-@app.route("/lti.xml", methods=["GET"])
+def edit_quiz(course, quiz_id, assignment_id, payload):
+    quiz = course.get_quiz(quiz_id)
+    quiz.edit(quiz=payload)
+    return [{"id": assignment_id, "title": quiz.title, "type": "Quiz"}]
+
+
+def edit_assignment(course, assignment_id, payload):
+    assignment = course.get_assignment(assignment_id)
+    assignment.edit(assignment=payload)
+    return [{"id": assignment_id, "title": assignment.name, "type": "Assignment"}]
+
+
+def edit_overrides(course, overrides):
+    return [
+        {
+            "id": six.text_type(override.assignment_id),
+            "title": override.title,
+            "type": "Override",
+        }
+        for override in course.update_assignment_overrides(overrides)
+    ]
+
+
+def run_edits(tasks, workers):
+    """
+    Run edit tasks, on a thread pool when ``workers`` is more than one.
+
+    Once a task fails, tasks that have not started yet are cancelled. Those
+    already running are allowed to finish and are reported.
+
+    :param tasks: A list of ``(assignment_id, function, error_message)``
+        tuples. Each function returns a list of updated items.
+    :param workers: The most tasks to run at once.
+    :returns: A tuple of the updated items, in task order, and the
+        assignment id of the first failed task or ``None``.
+    """
+    from canvasapi.exceptions import CanvasException
+
+    updated_list = []
+
+    if workers <= 1 or len(tasks) <= 1:
+        for assignment_id, function, message in tasks:
+            try:
+                updated_list.extend(function())
+            except CanvasException:
+                current_app.logger.exception(message)
+                return updated_list, assignment_id
+        return updated_list, None
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+        futures = [executor.submit(function) for _, function, _ in tasks]
+        wait(futures, return_when=FIRST_EXCEPTION)
+        for future in futures:
+            future.cancel()
+
+    failed_id = None
+    for (assignment_id, _, message), future in zip(tasks, futures):
+        if future.cancelled():
+            continue
+
+        exception = future.exception()
+        if exception is None:
+            updated_list.extend(future.result())
+        elif not isinstance(exception, CanvasException):
+            raise exception
+        elif failed_id is None:
+            current_app.logger.error(message, exc_info=exception)
+            failed_id = assignment_id
+
+    return updated_list, failed_id
+
+
+@bp.route("/course/<course_id>/export", methods=["GET"])
+@lti_required(request="session", role="staff")
+def export_assignments(course_id, lti=None):
+    from canvasapi.exceptions import CanvasException
+
+    export_format = request.args.get("format", "csv")
+    if export_format not in schedule.FORMATS:
+        return error({"exception": "Unknown export format."})
+
+    try:
+        course = get_canvas().get_course(course_id)
+        rows = iter_schedule(course)
+        # Pull the first row now so Canvas errors surface before streaming.
+        first = next(rows, None)
+    except CanvasException as err:
+        current_app.logger.exception(
+            "Error getting course, assignments or quizzes from Canvas."
+        )
+        return error({"exception": err})
+
+    if first is not None:
+        rows = itertools.chain([first], rows)
+
+    writer = schedule.write_json if export_format == "json" else schedule.write_csv
+    filename = "course-{}-due-dates.{}".format(course_id, export_format)
+
+    return Response(
+        stream_with_context(writer(rows)),
+        mimetype=schedule.FORMATS[export_format],
+        headers={"Content-Disposition": "attachment; filename={}".format(filename)},
+    )
+
+
+@bp.route("/course/<course_id>/import", methods=["POST"])
+@lti_required(request="session", role="staff")
+def import_assignments(course_id, lti=None):
+    from canvasapi.exceptions import CanvasException
+
+    def error_json(message, errors=None):
+        return Response(
+            json.dumps(
+                {
+                    "error": True,
+                    "message": message,
+                    "errors": errors or [],
+                    "updated": [],
+                }
+            ),
+            mimetype="application/json",
+        )
+
+    if not is_ajax_request(request):
+        return render_template("error.htm.j2", message="Non-AJAX requests not allowed.")
+
+    upload = request.files.get("file")
+    if upload is None:
+        return error_json("No file was uploaded.")
+
+    import_format = request.form.get("format") or schedule.guess_format(upload.filename)
+    imported, errors = schedule.read_rows(
+        upload.stream, import_format, current_app.config["LOCAL_TIME_FORMAT"]
+    )
+    if errors:
+        return error_json("The file could not be imported.", errors)
+
+    try:
+        course = get_canvas().get_course(course_id)
+        current = {six.text_type(row["id"]): row for row in iter_schedule(course)}
+    except CanvasException:
+        msg = "Error getting course #{}.".format(course_id)
+        current_app.logger.exception(msg)
+        return error_json(msg)
+
+    assignment_field_map, errors = schedule.diff_rows(current, imported)
+    if errors:
+        return error_json("The file could not be imported.", errors)
+
+    if len(assignment_field_map) < 1:
+        return Response(
+            json.dumps(
+                {"error": False, "message": "No changes to import.", "updated": []}
+            ),
+            mimetype="application/json",
+        )
+
+    return edit_assignments(course, assignment_field_map)
+
+
+def iter_schedule(course):
+    """
+    Yield one export row per assignment in the course.
+
+    Assignments are read a page at a time, so only the quiz answer dates are
+    held in memory.
+    """
+    quiz_dates = {
+        quiz.id: (
+            localize_or_blank(getattr(quiz, "show_correct_answers_at_date", None)),
+            localize_or_blank(getattr(quiz, "hide_correct_answers_at_date", None)),
+        )
+        for quiz in course.get_quizzes()
+    }
+
+    for assignment in course.get_assignments():
+        quiz_id = getattr(assignment, "quiz_id", None)
+        show_at, hide_at = quiz_dates.get(quiz_id, ("", ""))
+
+        yield {
+            "id": assignment.id,
+            "name": assignment.name,
+            "type": "quiz" if quiz_id else "assignment",
+            "quiz_id": quiz_id or "",
+            "published": bool(getattr(assignment, "published", False)),
+            "unpublishable": getattr(assignment, "unpublishable", True),
+            "due_at": localize_or_blank(getattr(assignment, "due_at_date", None)),
+            "unlock_at": localize_or_blank(getattr(assignment, "unlock_at_date", None)),
+            "lock_at": localize_or_blank(getattr(assignment, "lock_at_date", None)),
+            "show_correct_answers_at": show_at if quiz_id else "",
+            "hide_correct_answers_at": hide_at if quiz_id else "",
+        }
+
+
+def localize_or_blank(utc_datetime):
+    return datetime_localize(utc_datetime) if utc_datetime else ""
+
+
+def fix_date(value):
+    """
+    Convert a local time from the form into an ISO 8601 string for Canvas.
+    """
+    try:
+        value = datetime.strptime(value, current_app.config["LOCAL_TIME_FORMAT"])
+        value = timezone(current_app.config["TIME_ZONE"]).localize(value)
+        return value.isoformat()
+    except (ValueError, TypeError):
+        # Not a valid time. Just ignore.
+        return ""
+
+
+def error_json(assignment_id, updated_list):
+    msg = "There was an error editing one of the assignments. (ID: {})"
+    msg = msg.format(assignment_id)
+    if len(updated_list) > 0:
+        "{} {} assignments have been updated successfully.".format(
+            msg, len(updated_list)
+        )
+
+    return Response(
+        json.dumps({"error": True, "message": msg, "updated": updated_list}),
+        mimetype="application/json",
+    )
+
+
+def is_ajax_request(request):
+    """
+    Determine whether or not a request was made via AJAX.
+    """
+    return request.headers.get("X-Ddc-Ajax", "").lower() == "true"
+
+
+@bp.route("/live_events", methods=["POST"])
+def live_events():
+    """
+    Receive signed Canvas Live Events and invalidate the courses they change.
+
+    Disabled unless ``LIVE_EVENTS_SECRET`` is set.
+    """
+    secret = current_app.config["LIVE_EVENTS_SECRET"]
+    if not secret:
+        return Response(status=404)
+
+    body = request.get_data()
+    signature = request.headers.get(liveevents.SIGNATURE_HEADER)
+    if not liveevents.verify(body, secret, signature):
+        return Response(
+            json.dumps({"error": True, "message": "Invalid signature."}),
+            status=401,
+            mimetype="application/json",
+        )
+
+    try:
+        events = json.loads(body.decode("utf-8"))
+    except ValueError:
+        return Response(
+            json.dumps({"error": True, "message": "Invalid JSON."}),
+            status=400,
+            mimetype="application/json",
+        )
+    if not isinstance(events, list):
+        events = [events]
+
+    courses = current_app.extensions["ddc"]["courses"]
+    invalidated = set()
+    for event in events:
+        if not isinstance(event, dict):
+            continue
+        if liveevents.event_name(event) not in liveevents.EVENT_NAMES:
+            continue
+
+        course_id = liveevents.course_id(event)
+        if course_id is not None and course_id not in invalidated:
+            courses.invalidate(course_id)
+            invalidated.add(course_id)
+
+    return Response(
+        json.dumps({"error": False, "invalidated": sorted(invalidated)}),
+        mimetype="application/json",
+    )
+
+
+@bp.route("/profiles", methods=["GET"])
+@lti_required(request="session", role="any")
+def list_profiles(lti=None):
+    if not is_admin():
+        return error({"exception": "Not authorized."})
+
+    return Response(
+        json.dumps({"profiles": get_profile_store().list()}),
+        mimetype="application/json",
+    )
+
+
+@bp.route("/profiles/<name>", methods=["GET"])
+@lti_required(request="session", role="any")
+def download_profile(name, lti=None):
+    if not is_admin():
+        return error({"exception": "Not authorized."})
+
+    path = get_profile_store().path(name)
+    if path is None:
+        # Don't echo the name: error.htm.j2 does not escape its message.
+        return Response("Profile not found.", status=404, mimetype="text/plain")
+
+    return send_file(path, mimetype="application/octet-stream", as_attachment=True)
+
+
+def get_profile_store():
+    return app_store(current_app)
+
+
+def is_admin():
+    """
+    Check whether the LTI user has one of ``PROFILE_ADMIN_ROLES``.
+    """
+    roles = set((session.get("roles") or "").split(","))
+    return bool(roles & set(current_app.config["PROFILE_ADMIN_ROLES"]))
+
+
+@bp.route("/lti.xml", methods=["GET"])
 def xml():
     return Response(render_template("lti.xml.j2"), mimetype="application/xml")
 
 
-@app.template_filter()
-def datetime_localize(utc_datetime, format=LOCAL_TIME_FORMAT):
+@bp.app_template_filter()
+def datetime_localize(utc_datetime, format=None):
+    if format is None:
+        format = current_app.config["LOCAL_TIME_FORMAT"]
+
     if not utc_datetime.tzinfo:
         # Localize to UTC if there is no timezone information.
         utc_datetime = utc.localize(utc_datetime)
 
-    new_tz = timezone(TIME_ZONE)
+    new_tz = timezone(current_app.config["TIME_ZONE"])
     local_datetime = utc_datetime.astimezone(new_tz)
 
     return local_datetime.strftime(format)
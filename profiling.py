@@ -0,0 +1,271 @@
+from collections import Counter
+import cProfile
+import io
+import marshal
+import os
+import random
+import re
+import sys
+import threading
+import time
+
+# Profile files are named "<time>-<pid>-<method>-<path>-<ms>ms.<kind>".
+PROFILE_NAME = re.compile(r"^\d{8}T\d{12}-\d+-[A-Z]+-[\w-]*-\d+ms\.(prof|txt)$")
+
+
+class RequestProfiler(object):
+    """
+    WSGI middleware that profiles some requests and saves the profiles.
+
+    A request is profiled with cProfile when ``PROFILE_ALL`` is set or it is
+    picked at ``PROFILE_SAMPLE_RATE``, and saved as a ``.prof`` file for
+    ``pstats`` or snakeviz. Otherwise, if ``PROFILE_SLOW_SECONDS`` is set,
+    the request's stack is sampled every ``PROFILE_INTERVAL`` seconds and
+    saved as folded stacks (a ``.txt`` file for flamegraph.pl or speedscope)
+    only if the request took longer than that. One thread per process samples
+    every request in flight, so sampling costs far less than cProfile and
+    can stay on under real load.
+
+    Settings are read from the app's config on every request. Only the time
+    until the response starts is profiled, not the streaming of its body.
+    """
+
+    def __init__(self, app, wsgi_app):
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.sampler = StackSampler()
+
+    def __call__(self, environ, start_response):
+        config = self.app.config
+        if environ.get("PATH_INFO", "").startswith("/profiles"):
+            return self.wsgi_app(environ, start_response)
+
+        rate = config["PROFILE_SAMPLE_RATE"]
+        if config["PROFILE_ALL"] or (rate and random.random() < rate):
+            return self.profile(environ, start_response)
+        if config["PROFILE_SLOW_SECONDS"]:
+            return self.sample(environ, start_response)
+        return self.wsgi_app(environ, start_response)
+
+    def profile(self, environ, start_response):
+        profiler = cProfile.Profile()
+        start = time.time()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Newer Pythons allow only one active profiler per process.
+            return self.wsgi_app(environ, start_response)
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            profiler.disable()
+            profiler.create_stats()
+            self.save(
+                environ, time.time() - start, "prof", marshal.dumps(profiler.stats)
+            )
+
+    def sample(self, environ, start_response):
+        thread_id = threading.current_thread().ident
+        counts = self.sampler.register(
+            thread_id, self.app.config["PROFILE_INTERVAL"], root=sys._getframe()
+        )
+        start = time.time()
+        try:
+            return self.wsgi_app(environ, start_response)
+        finally:
+            self.sampler.unregister(thread_id)
+            elapsed = time.time() - start
+            if elapsed >= self.app.config["PROFILE_SLOW_SECONDS"]:
+                self.save(environ, elapsed, "txt", folded(counts).encode("utf-8"))
+
+    def save(self, environ, elapsed, kind, data):
+        try:
+            self.store().save(
+                environ.get("REQUEST_METHOD", "GET"),
+                environ.get("PATH_INFO", ""),
+                elapsed,
+                kind,
+                data,
+            )
+        except Exception:
+            self.app.logger.exception("Could not save request profile.")
+
+    def store(self):
+        return app_store(self.app)
+
+
+class StackSampler(object):
+    """
+    Count the stacks of registered threads from one background thread.
+
+    Each tick takes a single snapshot of every thread's frame and counts the
+    stacks of the registered ones, so the cost per tick does not grow with
+    the number of requests being sampled. The thread stops when nothing is
+    registered, and each process starts its own.
+    """
+
+    def __init__(self):
+        self.interval = 0.005
+        self._watched = {}
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def register(self, thread_id, interval, root=None):
+        """
+        Start sampling a thread.
+
+        :param root: Frames from this one outward are left off each stack.
+        :returns: A ``Counter`` of folded stacks, filled in until
+            ``unregister`` is called.
+        """
+        counts = Counter()
+        with self._lock:
+            if self._pid != os.getpid():
+                # Not running in this process, or forked from a parent whose
+                # sampler thread did not come with us.
+                self._watched = {}
+                self._pid = os.getpid()
+                thread = threading.Thread(target=self.run)
+                thread.daemon = True
+                thread.start()
+
+            self.interval = interval
+            self._watched[thread_id] = (root, counts)
+        return counts
+
+    def unregister(self, thread_id):
+        """
+        Stop sampling a thread. Its counts are not touched after this.
+        """
+        with self._lock:
+            self._watched.pop(thread_id, None)
+
+    def run(self):
+        while True:
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+
+            with self._lock:
+                if not self._watched:
+                    self._pid = None
+                    return
+
+                for thread_id, (root, counts) in self._watched.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        counts[fold(frame, root)] += 1
+
+
+def folded(counts):
+    """
+    Return stack counts in folded format, one ``stack count`` per line.
+    """
+    return "".join(
+        "{} {}\n".format(stack, count) for stack, count in counts.most_common()
+    )
+
+
+def fold(frame, root=None):
+    """
+    Describe a stack as its frames joined by ``;``, outermost first.
+    """
+    names = []
+    while frame is not None and frame is not root:
+        code = frame.f_code
+        names.append(
+            "{}({}:{})".format(
+                code.co_name, os.path.basename(code.co_filename), frame.f_lineno
+            )
+        )
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def app_store(app):
+    """
+    Return the ``ProfileStore`` set up in an app's config.
+
+    A relative ``PROFILE_DIR`` is taken from the app's root path, as
+    ``send_file`` does, so profiles are found wherever the server started.
+    """
+    return ProfileStore(
+        os.path.join(app.root_path, app.config["PROFILE_DIR"]),
+        app.config["PROFILE_KEEP"],
+    )
+
+
+class ProfileStore(object):
+    """
+    A directory holding at most ``keep`` profile files, oldest dropped first.
+
+    Several worker processes can share the directory. File names include
+    the process id, and files are renamed into place once fully written.
+    """
+
+    def __init__(self, directory, keep):
+        self.directory = directory
+        self.keep = keep
+
+    def save(self, method, path, elapsed, kind, data):
+        if not os.path.isdir(self.directory):
+            os.makedirs(self.directory)
+
+        now = time.time()
+        name = "{}{:06d}-{}-{}-{}-{}ms.{}".format(
+            time.strftime("%Y%m%dT%H%M%S", time.gmtime(now)),
+            int(now % 1 * 1000000),
+            os.getpid(),
+            re.sub(r"[^A-Z]", "", method.upper()) or "GET",
+            re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60],
+            int(elapsed * 1000),
+            kind,
+        )
+        temp_path = os.path.join(self.directory, "." + name)
+        with io.open(temp_path, "wb") as temp_file:
+            temp_file.write(data)
+        os.rename(temp_path, os.path.join(self.directory, name))
+
+        self.prune()
+        return name
+
+    def names(self):
+        """
+        Return the stored profile names, newest first.
+        """
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return []
+        return sorted(
+            (name for name in names if PROFILE_NAME.match(name)), reverse=True
+        )
+
+    def prune(self):
+        for name in self.names()[self.keep :]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass  # Another worker removed it first.
+
+    def list(self):
+        """
+        Describe each stored profile, newest first.
+        """
+        profiles = []
+        for name in self.names():
+            try:
+                size = os.path.getsize(os.path.join(self.directory, name))
+            except OSError:
+                continue
+            profiles.append({"name": name, "size": size})
+        return profiles
+
+    def path(self, name):
+        """
+        Return the path of a stored profile, or ``None`` if there is none.
+        """
+        if not PROFILE_NAME.match(name):
+            return None
+
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
@@ -0,0 +1,230 @@
+import codecs
+import csv
+from datetime import datetime
+import json
+
+import six
+
+FORMATS = {"csv": "text/csv", "json": "application/json"}
+
+# Columns written on export, in order. Only the editable ones are read back.
+EXPORT_FIELDS = [
+    "id",
+    "name",
+    "type",
+    "quiz_id",
+    "published",
+    "due_at",
+    "unlock_at",
+    "lock_at",
+    "show_correct_answers_at",
+    "hide_correct_answers_at",
+]
+DATE_FIELDS = [
+    "due_at",
+    "unlock_at",
+    "lock_at",
+    "show_correct_answers_at",
+    "hide_correct_answers_at",
+]
+EDITABLE_FIELDS = ["published"] + DATE_FIELDS
+
+TRUE_VALUES = ("true", "on", "yes", "1")
+FALSE_VALUES = ("false", "off", "no", "0")
+
+# Shown in validation errors to illustrate the expected date format.
+EXAMPLE_DATE = datetime(2020, 1, 31, 23, 59)
+
+
+def guess_format(filename):
+    """
+    Pick an import format from an uploaded file's name. Defaults to CSV.
+    """
+    if filename and filename.lower().endswith(".json"):
+        return "json"
+    return "csv"
+
+
+def write_csv(rows):
+    """
+    Yield the rows as CSV text, one line at a time.
+    """
+    buffer = six.StringIO()
+    writer = csv.writer(buffer)
+
+    def flush():
+        value = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate(0)
+        return value
+
+    writer.writerow(EXPORT_FIELDS)
+    yield flush()
+
+    for row in rows:
+        values = dict(row, published="true" if row["published"] else "false")
+        writer.writerow([values[field] for field in EXPORT_FIELDS])
+        yield flush()
+
+
+def write_json(rows):
+    """
+    Yield the rows as a JSON array, one object at a time.
+    """
+    yield "["
+    separator = ""
+    for row in rows:
+        yield separator + json.dumps({field: row[field] for field in EXPORT_FIELDS})
+        separator = ","
+    yield "]"
+
+
+def read_rows(stream, import_format, time_format):
+    """
+    Parse and validate an uploaded schedule.
+
+    Columns that are missing from the file are left out of the result so
+    they keep their current values. Dates are normalized to ``time_format``.
+
+    :param stream: A binary file object.
+    :param import_format: ``"csv"`` or ``"json"``.
+    :param time_format: The ``strptime`` format dates must be written in.
+    :returns: A tuple of a dict mapping each assignment id to its editable
+        fields, and a list of error messages.
+    """
+    if import_format == "json":
+        try:
+            records = json.loads(stream.read().decode("utf-8-sig"))
+        except ValueError:
+            return {}, ["The file is not valid JSON."]
+        if not isinstance(records, list) or not all(
+            isinstance(record, dict) for record in records
+        ):
+            return {}, ["The file must contain a list of assignment objects."]
+    else:
+        lines = stream if six.PY2 else codecs.iterdecode(stream, "utf-8-sig")
+        records = csv.DictReader(lines)
+
+    rows = {}
+    errors = []
+    try:
+        for number, record in enumerate(records, 1):
+            assignment_id = six.text_type(record.get("id") or "").strip()
+            if not assignment_id.isdigit():
+                errors.append("Row {}: missing or invalid id.".format(number))
+                continue
+            if assignment_id in rows:
+                errors.append(
+                    "Row {}: assignment {} appears more than once.".format(
+                        number, assignment_id
+                    )
+                )
+                continue
+
+            fields = {}
+            for field in EDITABLE_FIELDS:
+                if field not in record:
+                    continue
+
+                value = record[field]
+                if value is None and import_format != "json":
+                    # csv.DictReader pads short rows with None. Treating that
+                    # as blank would clear the date in Canvas.
+                    errors.append(
+                        "Row {}: missing a value for {}.".format(number, field)
+                    )
+                    continue
+                if field == "published":
+                    value = parse_bool(value)
+                    if value is None:
+                        errors.append(
+                            "Row {}: published must be true or false.".format(number)
+                        )
+                        continue
+                else:
+                    value = parse_date(value, time_format)
+                    if value is None:
+                        errors.append(
+                            "Row {}: {} must be blank or a date like {}.".format(
+                                number,
+                                field,
+                                EXAMPLE_DATE.strftime(time_format),
+                            )
+                        )
+                        continue
+
+                fields[field] = value
+
+            rows[assignment_id] = fields
+    except csv.Error as err:
+        errors.append("The file is not valid CSV: {}".format(err))
+    except ValueError:
+        # Includes UnicodeDecodeError, e.g. from an Excel cp1252 export.
+        errors.append("The file is not valid UTF-8 CSV.")
+
+    return rows, errors
+
+
+def parse_bool(value):
+    if isinstance(value, bool):
+        return value
+
+    value = six.text_type(value or "").strip().lower()
+    if value in TRUE_VALUES:
+        return True
+    if value in FALSE_VALUES:
+        return False
+    return None
+
+
+def parse_date(value, time_format):
+    """
+    Normalize a date string to ``time_format``. Blank values become ``""``
+    and invalid ones ``None``.
+    """
+    value = six.text_type(value or "").strip()
+    if not value:
+        return ""
+
+    try:
+        return datetime.strptime(value, time_format).strftime(time_format)
+    except ValueError:
+        return None
+
+
+def diff_rows(current, imported):
+    """
+    Work out which imported rows actually change something.
+
+    :param current: Maps each assignment id in the course to its exported row.
+    :param imported: The rows returned by ``read_rows``.
+    :returns: A tuple of a field map in the shape the update form posts,
+        holding only changed assignments, and a list of error messages.
+    """
+    field_map = {}
+    errors = []
+
+    for assignment_id, fields in six.iteritems(imported):
+        row = current.get(assignment_id)
+        if row is None:
+            errors.append("Assignment {} is not in this course.".format(assignment_id))
+            continue
+
+        merged = {field: row[field] for field in EDITABLE_FIELDS}
+        merged.update(fields)
+        if not row["unpublishable"]:
+            # Assignments with submissions can't be unpublished.
+            merged["published"] = True
+
+        if all(merged[field] == row[field] for field in EDITABLE_FIELDS):
+            continue
+
+        form = {field: merged[field] for field in DATE_FIELDS}
+        form["published"] = "on" if merged["published"] else ""
+        form["assignment_type"] = row["type"]
+        if row["quiz_id"]:
+            form["quiz_id"] = six.text_type(row["quiz_id"])
+
+        field_map[assignment_id] = form
+
+    return field_map, errors
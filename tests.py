@@ -1,23 +1,43 @@
+import gzip
+import io
+import json
 import logging
+import os
+import pstats
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import unittest
 
+try:  # pragma: no cover
+    from unittest import mock  # py3
+except ImportError:  # pragma: no cover
+    import mock  # py2
+
+import flask
 import flask_testing
-import oauthlib.oauth1
 from pylti.common import LTI_SESSION_KEY
 import requests_mock
 from six.moves.urllib.parse import urlencode
 
+import cache
+import health
+from launch import generate_launch_request
+import liveevents
+import logqueue
 import lti
 
-try:  # pragma: no cover
-    from unittest.mock import patch  # py3
-except ImportError:  # pragma: no cover
-    from mock import patch  # py2
+# Seconds allowed for ``import lti`` plus ``create_app()`` in a fresh process.
+STARTUP_BUDGET = 1.0
 
 
 @requests_mock.Mocker()
 class LTITests(flask_testing.TestCase):
     def create_app(self):
-        app = lti.app
+        app = lti.create_app()
         app.config["PRESERVE_CONTEXT_ON_EXCEPTION"] = False
         app.config["DEBUG"] = True
         return app
@@ -26,75 +46,924 @@ class LTITests(flask_testing.TestCase):
     def setUpClass(cls):
         logging.disable(logging.CRITICAL)
 
-    @classmethod
-    def tearDownClass(cls):
-        logging.disable(logging.NOTSET)
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+
+    def test_index(self, m):
+        response = self.client.get(self.generate_launch_request("/"))
+
+        self.assert_200(response)
+        self.assertEqual(response.data, b"Please contact your System Administrator.")
+
+    def test_xml(self, m):
+        response = self.client.get("/lti.xml")
+
+        self.assert_200(response)
+        self.assert_template_used("lti.xml.j2")
+        self.assertIn("application/xml", response.content_type)
+
+    def test_status_live(self, m):
+        response = self.client.get("/status/live")
+
+        self.assert_200(response)
+        self.assertTrue(response.json["alive"])
+        self.assertEqual(m.call_count, 0)
+
+    def test_status_ready(self, m):
+        m.register_uri("GET", "/api/v1/users/self", json={"id": 1, "name": "API User"})
+        self.app.extensions["ddc"]["api_key_check"].refresh()
+
+        response = self.client.get("/status/ready")
+
+        self.assert_200(response)
+        self.assertTrue(response.json["healthy"])
+        self.assertEqual(
+            response.json["checks"], {"index": True, "xml": True, "api_key": True}
+        )
+        self.assertEqual(response.json["logging"]["dropped"], 0)
+
+        # Probes within the TTL are answered from the cache.
+        self.client.get("/status")
+        self.client.get("/status/ready")
+        self.assertEqual(m.call_count, 1)
+
+    def test_status_ready_bad_api_key(self, m):
+        m.register_uri("GET", "/api/v1/users/self", status_code=401)
+        self.app.extensions["ddc"]["api_key_check"].refresh()
+
+        response = self.client.get("/status/ready")
+
+        self.assertStatus(response, 503)
+        self.assertFalse(response.json["healthy"])
+        self.assertFalse(response.json["checks"]["api_key"])
+
+        response = self.client.get("/status")
+
+        self.assert_200(response)
+        self.assertFalse(response.json["healthy"])
+
+    def test_launch(self, m):
+        self.app.config["ALLOWED_CANVAS_DOMAINS"] = [None]
+        payload = {"custom_canvas_course_id": "1"}
+
+        signed_url = self.generate_launch_request(
+            "/launch",
+            http_method="POST",
+            body=payload,
+            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        )
+
+        with self.client:
+            response = self.client.post(signed_url, data=payload)
+
+            self.assertRedirects(response, "/course/1/assignments")
+            self.assertIsNone(flask.session["canvas_domain"])
+
+    def test_show_assignments_role_student(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Student"
+
+        response = self.client.get(
+            self.generate_launch_request("/course/1/assignments")
+        )
+        self.assert_200(response)
+        self.assert_template_used("error.htm.j2")
+        self.assertEqual(str(self.get_context_variable("message")), "Not authorized.")
+
+    def test_show_assignments_course_not_found(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1",
+            json={
+                "errors": [{"message": "The specified resource does not exist."}],
+                "error_report_id": 1234,
+            },
+            status_code=404,
+        )
+
+        response = self.client.get(
+            self.generate_launch_request("/course/1/assignments")
+        )
+        self.assert_200(response)
+        self.assert_template_used("error.htm.j2")
+        self.assertEqual(str(self.get_context_variable("message")), "Not Found")
+
+    def test_show_assignments_quizzes_not_found(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1",
+            json={"id": 1, "name": "Course 1"},
+            status_code=200,
+        )
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/quizzes",
+            json={
+                "errors": [{"message": "The specified resource does not exist."}],
+                "error_report_id": 1234,
+            },
+            status_code=404,
+        )
+
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignments",
+            json=[{"id": 1, "name": "Quiz 1", "quiz_id": 1}],
+            status_code=200,
+        )
+
+        response = self.client.get(
+            self.generate_launch_request("/course/1/assignments")
+        )
+        self.assert_200(response)
+        self.assert_template_used("error.htm.j2")
+        self.assertEqual(str(self.get_context_variable("message")), "Not Found")
+
+    def test_show_assignments_assignments_not_found(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1",
+            json={"id": 1, "name": "Course 1"},
+            status_code=200,
+        )
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/quizzes",
+            json=[{"id": 1, "title": "Quiz 1"}, {"id": 2, "title": "Quiz 2"}],
+            status_code=200,
+        )
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignments",
+            json={
+                "errors": [{"message": "The specified resource does not exist."}],
+                "error_report_id": 1234,
+            },
+            status_code=404,
+        )
+
+        response = self.client.get(
+            self.generate_launch_request("/course/1/assignments")
+        )
+        self.assert_200(response)
+        self.assert_template_used("error.htm.j2")
+        self.assertEqual(str(self.get_context_variable("message")), "Not Found")
+
+    def test_show_assignments(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1",
+            json={"id": 1, "name": "Course 1"},
+            status_code=200,
+        )
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/quizzes",
+            json=[
+                {
+                    "id": 1,
+                    "title": "Quiz 1",
+                    "show_correct_answers_at": "2017-01-01T00:00:01Z",
+                    "hide_correct_answers_at": "2017-12-31T23:59:59Z",
+                },
+                {"id": 2, "title": "Quiz 2"},
+            ],
+            status_code=200,
+        )
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignments",
+            json=[
+                {"id": 1, "title": "Non-Quiz Assignment 1"},
+                {"id": 2, "title": "Quiz 1", "quiz_id": 1},
+                {"id": 3, "title": "Quiz 2", "quiz_id": 2},
+                {"id": 4, "title": "Non- Quiz Assignment 2"},
+            ],
+            status_code=200,
+        )
+
+        response = self.client.get(
+            self.generate_launch_request("/course/1/assignments")
+        )
+        self.assert_200(response)
+        self.assert_template_used("assignments.htm.j2")
+        assignments = self.get_context_variable("assignments")
+        self.assertIsInstance(assignments, list)
+        self.assertEqual(len(assignments), 4)
+
+    def test_show_assignments_scoped_to_group(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri("GET", "/api/v1/courses/1", json={"id": 1, "name": "Course 1"})
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignment_groups",
+            json=[{"id": 3, "name": "Week <3>"}, {"id": 4, "name": "Week 4"}],
+        )
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignment_groups/3/assignments",
+            json=[
+                {"id": 1, "name": "Essay"},
+                {"id": 2, "name": "Quiz 1", "quiz_id": 5},
+                {"id": 3, "name": "Deleted Quiz", "quiz_id": 6},
+            ],
+        )
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/quizzes/6",
+            json={"errors": [{"message": "The specified resource does not exist."}]},
+            status_code=404,
+        )
+        quiz = m.register_uri(
+            "GET",
+            "/api/v1/courses/1/quizzes/5",
+            json={
+                "id": 5,
+                "title": "Quiz 1",
+                "show_correct_answers_at": "2017-01-01T00:00:01Z",
+            },
+        )
+
+        response = self.client.get(
+            "/course/1/assignments",
+            query_string={"group": "3"},
+        )
+
+        self.assert_200(response)
+        self.assertEqual(len(self.get_context_variable("assignments")), 3)
+        self.assertEqual(self.get_context_variable("scope").group, "3")
+        self.assertIn(
+            b'<option value="3" selected>Week &lt;3&gt;</option>', response.data
+        )
+        self.assertEqual(quiz.call_count, 1)
+        self.assertTrue(
+            hasattr(
+                self.get_context_variable("assignments")[1],
+                "show_correct_answers_at_date",
+            )
+        )
+
+        # Switching scope from the page only returns the rows.
+        response = self.client.get(
+            "/course/1/assignments",
+            query_string={"group": "3"},
+            headers={"X-Ddc-Ajax": "true"},
+        )
+
+        self.assert_200(response)
+        self.assert_template_used("assignment_rows.htm.j2")
+        self.assertNotIn(b"assignments_form", response.data)
+        self.assertIn(b'name="1-due_at"', response.data)
+
+    def test_show_assignments_scoped_to_dates_and_name(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri("GET", "/api/v1/courses/1", json={"id": 1, "name": "Course 1"})
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        assignments = m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignments",
+            json=[
+                {"id": 1, "name": "Lab 1", "due_at": "2020-01-06T04:59:00Z"},
+                {"id": 2, "name": "Lab 2", "due_at": "2020-01-13T04:59:00Z"},
+                {
+                    "id": 3,
+                    "name": "Lab 3",
+                    "due_at": "2020-01-20T04:59:00Z",
+                    "overrides": [
+                        {"id": 7, "assignment_id": 3, "due_at": "2020-01-10T17:00:00Z"}
+                    ],
+                },
+                {"id": 4, "name": "Lab 4"},
+            ],
+        )
+
+        # 2020-01-13T04:59Z is 11:59 PM on the 12th in US/Eastern.
+        response = self.client.get(
+            "/course/1/assignments",
+            query_string={
+                "start": "2020-01-06",
+                "end": "2020-01-12",
+                "search": "Lab",
+                "group": "not a group",
+            },
+        )
+
+        self.assert_200(response)
+        self.assertEqual(
+            [a.id for a in self.get_context_variable("assignments")], [2, 3]
+        )
+        self.assertEqual(assignments.last_request.qs["search_term"], ["lab"])
+        self.assertIsNone(self.get_context_variable("scope").group)
+
+    def test_show_assignments_row_cache(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1",
+            json={"id": 1, "name": "Course 1"},
+            status_code=200,
+        )
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/quizzes",
+            json=[],
+            status_code=200,
+        )
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignments",
+            [
+                {
+                    "json": [
+                        {"id": 1, "name": "Assignment 1", "updated_at": "1"},
+                        {"id": 2, "name": "Assignment 2", "updated_at": "1"},
+                    ]
+                },
+                {
+                    "json": [
+                        {"id": 1, "name": "Assignment 1", "updated_at": "1"},
+                        {"id": 2, "name": "Assignment 2", "updated_at": "1"},
+                    ]
+                },
+                {
+                    "json": [
+                        {"id": 1, "name": "Assignment 1", "updated_at": "1"},
+                        {"id": 2, "name": "Renamed", "updated_at": "2"},
+                    ]
+                },
+            ],
+        )
+        fragments = self.app.extensions["ddc"]["fragments"]
+        url = self.generate_launch_request("/course/1/assignments")
+
+        first = self.client.get(url)
+        self.assertEqual(len(fragments), 2)
+
+        second = self.client.get(url)
+        self.assertEqual(len(fragments), 2)
+        self.assertEqual(first.data, second.data)
+
+        third = self.client.get(url)
+        self.assertEqual(len(fragments), 3)
+        self.assertIn(b"Renamed", third.data)
+
+    def test_row_cache_override_renamed(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri("GET", "/api/v1/courses/1", json={"id": 1, "name": "Course 1"})
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri("GET", "/api/v1/courses/1/quizzes", json=[])
+
+        def assignments(title):
+            override = {"id": 7, "assignment_id": 42, "title": title}
+            return {
+                "json": [
+                    {"id": 42, "name": "A", "updated_at": "1", "overrides": [override]}
+                ]
+            }
+
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignments",
+            [assignments("Section 1"), assignments("Section One")],
+        )
+        url = self.generate_launch_request("/course/1/assignments")
+
+        self.assertIn(b"Override for Section 1", self.client.get(url).data)
+        self.assertIn(b"Override for Section One", self.client.get(url).data)
+
+    def test_show_assignments_canvas_domain(self, m):
+        self.app.config["CANVAS_DOMAINS"] = {
+            "beta.example.edu": {"url": "https://beta.example.edu", "api_key": "beta"}
+        }
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+            sess["canvas_domain"] = "beta.example.edu"
+
+        m.register_uri(
+            "GET",
+            "https://beta.example.edu/api/v1/courses/1",
+            json={"id": 1, "name": "Course 1"},
+        )
+        m.register_uri(
+            "GET", "https://beta.example.edu/api/v1/courses/1/quizzes", json=[]
+        )
+        m.register_uri(
+            "GET",
+            "https://beta.example.edu/api/v1/courses/1/assignment_groups",
+            json=[],
+        )
+        m.register_uri(
+            "GET",
+            "https://beta.example.edu/api/v1/courses/1/assignments",
+            json=[{"id": 1, "name": "Assignment 1", "updated_at": "1"}],
+        )
+
+        response = self.client.get(
+            self.generate_launch_request("/course/1/assignments")
+        )
+
+        self.assert_200(response)
+        self.assertIn(
+            b"https://beta.example.edu/courses/1/assignments/1", response.data
+        )
+        self.assertTrue(
+            all(
+                request.headers["Authorization"] == "Bearer beta"
+                for request in m.request_history
+            )
+        )
+
+    def send_live_event(self, event, secret="events"):
+        body = json.dumps(event).encode("utf-8")
+        return self.client.post(
+            "/live_events",
+            data=body,
+            content_type="application/json",
+            headers={liveevents.SIGNATURE_HEADER: liveevents.sign(body, secret)},
+        )
+
+    def test_live_events_invalidate_course_cache(self, m):
+        self.app.config["LIVE_EVENTS_SECRET"] = "events"
+        self.app.extensions["ddc"]["courses"] = cache.CourseCache(300, 10)
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        m.register_uri("GET", "/api/v1/courses/1", json={"id": 1, "name": "Course 1"})
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri("GET", "/api/v1/courses/1/quizzes", json=[])
+        assignments = m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignments",
+            [
+                {"json": [{"id": 1, "name": "Assignment 1"}]},
+                {"json": [{"id": 1, "name": "Renamed in Canvas"}]},
+            ],
+        )
+        url = self.generate_launch_request("/course/1/assignments")
+
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(assignments.call_count, 1)
+
+        # Events for other courses, or that don't affect dates, are ignored.
+        response = self.send_live_event(
+            [
+                liveevents.make_event("assignment_updated", 2, assignment_id="5"),
+                liveevents.make_event("submission_created", 1),
+            ]
+        )
+        self.assert_200(response)
+        self.assertEqual(response.json["invalidated"], ["2"])
+        self.client.get(url)
+        self.assertEqual(assignments.call_count, 1)
+
+        # Course ids may arrive as Canvas global ids.
+        response = self.send_live_event(
+            liveevents.make_event(
+                "assignment_updated", 10000000000001, assignment_id="1"
+            )
+        )
+        self.assertEqual(response.json["invalidated"], ["1"])
+
+        response = self.client.get(url)
+        self.assertEqual(assignments.call_count, 2)
+        self.assertIn(b"Renamed in Canvas", response.data)
+
+    def test_live_events_bad_signature(self, m):
+        self.app.config["LIVE_EVENTS_SECRET"] = "events"
+
+        response = self.send_live_event(
+            liveevents.make_event("assignment_updated", 1), secret="wrong"
+        )
+        self.assert_401(response)
+
+        body = json.dumps(liveevents.make_event("assignment_updated", 1))
+        response = self.client.post(
+            "/live_events",
+            data=body,
+            content_type="application/json",
+            headers={liveevents.SIGNATURE_HEADER: "caf\u00e9"},
+        )
+        self.assert_401(response)
+
+        self.app.config["LIVE_EVENTS_SECRET"] = None
+        response = self.send_live_event(liveevents.make_event("assignment_updated", 1))
+        self.assert_404(response)
+
+    def test_live_events_malformed(self, m):
+        self.app.config["LIVE_EVENTS_SECRET"] = "events"
+
+        response = self.send_live_event(
+            [
+                {"metadata": None, "body": None},
+                {"metadata": "assignment_updated", "body": [1]},
+                dict(liveevents.make_event("assignment_updated", 3), body=None),
+            ]
+        )
+
+        self.assert_200(response)
+        self.assertEqual(response.json["invalidated"], ["3"])
+
+    def profile_dir(self):
+        profile_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, profile_dir)
+        self.app.config["PROFILE_DIR"] = profile_dir
+        return profile_dir
+
+    def test_profile_all_requests(self, m):
+        profile_dir = self.profile_dir()
+        self.app.config["PROFILE_ALL"] = True
+        self.app.config["PROFILE_KEEP"] = 2
+
+        for _ in range(3):
+            self.client.get("/status/live")
+
+        names = sorted(os.listdir(profile_dir))
+        self.assertEqual(len(names), 2)
+        self.assertRegex(names[0], r"-GET-status_live-\d+ms\.prof$")
+        stats = pstats.Stats(os.path.join(profile_dir, names[0]))
+        self.assertTrue(any(function[2] == "status_live" for function in stats.stats))
+
+    def test_profile_slow_requests(self, m):
+        profile_dir = self.profile_dir()
+        self.app.config["PROFILE_SLOW_SECONDS"] = 0.05
+        self.app.config["PROFILE_INTERVAL"] = 0.001
+
+        self.client.get("/status/live")
+        self.assertEqual(os.listdir(profile_dir), [])
+
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        def slow_course(request, context):
+            time.sleep(0.1)
+            return {"id": 1, "name": "Course 1"}
+
+        m.register_uri("GET", "/api/v1/courses/1", json=slow_course)
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri("GET", "/api/v1/courses/1/quizzes", json=[])
+        m.register_uri("GET", "/api/v1/courses/1/assignments", json=[])
+        self.client.get(self.generate_launch_request("/course/1/assignments"))
+
+        (name,) = os.listdir(profile_dir)
+        self.assertRegex(name, r"-GET-course_1_assignments-\d+ms\.txt$")
+        with open(os.path.join(profile_dir, name)) as profile:
+            stack = profile.readline()
+        self.assertTrue(stack.startswith("wsgi_app("))
+        self.assertIn(";slow_course(tests.py:", stack)
+
+    def test_profiles_admin_only(self, m):
+        profile_dir = self.profile_dir()
+        self.app.config["PROFILE_ALL"] = True
+        self.client.get("/status/live")
+        self.app.config["PROFILE_ALL"] = False
+        (name,) = os.listdir(profile_dir)
+
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        response = self.client.get(self.generate_launch_request("/profiles"))
+        self.assert_template_used("error.htm.j2")
+        self.assertEqual(str(self.get_context_variable("message")), "Not authorized.")
+
+        with self.client.session_transaction() as sess:
+            sess["roles"] = "Instructor,urn:lti:instrole:ims/lis/Administrator"
+
+        response = self.client.get(self.generate_launch_request("/profiles"))
+        self.assertEqual([p["name"] for p in response.json["profiles"]], [name])
+
+        response = self.client.get(
+            self.generate_launch_request("/profiles/{}".format(name))
+        )
+        self.assert_200(response)
+        with open(os.path.join(profile_dir, name), "rb") as profile:
+            self.assertEqual(response.data, profile.read())
+        response.close()
+
+        response = self.client.get(
+            self.generate_launch_request("/profiles/..%2Fconfig.py")
+        )
+        self.assert_404(response)
+
+        response = self.client.get("/profiles/<img src=x onerror=alert(1)>")
+        self.assert_404(response)
+        self.assertNotIn(b"<img", response.data)
+
+    def test_relative_profile_dir_under_root_path(self, m):
+        root_path = self.profile_dir()
+        self.app.config["PROFILE_DIR"] = "profiles"
+        self.addCleanup(setattr, self.app, "root_path", self.app.root_path)
+        self.app.root_path = root_path
+        # Run from elsewhere, as a server started in another directory would.
+        self.addCleanup(os.chdir, os.getcwd())
+        os.chdir(tempfile.gettempdir())
+
+        self.app.config["PROFILE_ALL"] = True
+        self.client.get("/status/live")
+        self.app.config["PROFILE_ALL"] = False
+        (name,) = os.listdir(os.path.join(root_path, "profiles"))
+
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "urn:lti:instrole:ims/lis/Administrator"
+
+        response = self.client.get(
+            self.generate_launch_request("/profiles/{}".format(name))
+        )
+        self.assert_200(response)
+        response.close()
+
+    def test_gzip_response(self, m):
+        response = self.client.get("/lti.xml", headers={"Accept-Encoding": "gzip"})
+
+        self.assert_200(response)
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response.headers["Vary"])
+        self.assertIn(
+            b"cartridge_basiclti_link",
+            gzip.GzipFile(fileobj=io.BytesIO(response.data)).read(),
+        )
+
+    def test_uncompressed_response(self, m):
+        response = self.client.get("/lti.xml")
+
+        self.assert_200(response)
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertIn(b"cartridge_basiclti_link", response.data)
+
+    def register_schedule(self, m):
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1",
+            json={"id": 1, "name": "Course 1"},
+            status_code=200,
+        )
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/quizzes",
+            json=[
+                {
+                    "id": 55,
+                    "title": "Quiz 1",
+                    "show_correct_answers_at": "2020-02-01T15:00:00Z",
+                },
+            ],
+            status_code=200,
+        )
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/assignments",
+            json=[
+                {
+                    "id": 42,
+                    "name": "The Answer",
+                    "published": True,
+                    "unpublishable": True,
+                    "due_at": "2020-01-31T23:59:00Z",
+                },
+                {
+                    "id": 10,
+                    "name": "Quiz 1",
+                    "quiz_id": 55,
+                    "published": False,
+                    "unpublishable": True,
+                },
+            ],
+            status_code=200,
+        )
+
+    def test_export_assignments_csv(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        self.register_schedule(m)
+
+        response = self.client.get("/course/1/export", query_string={"format": "csv"})
+
+        self.assert_200(response)
+        self.assertIn("text/csv", response.content_type)
+        self.assertIn("attachment", response.headers["Content-Disposition"])
+        self.assertEqual(
+            response.data.decode("utf-8").splitlines(),
+            [
+                "id,name,type,quiz_id,published,due_at,unlock_at,lock_at,"
+                "show_correct_answers_at,hide_correct_answers_at",
+                "42,The Answer,assignment,,true,01/31/2020 06:59 PM,,,,",
+                "10,Quiz 1,quiz,55,false,,,,02/01/2020 10:00 AM,",
+            ],
+        )
+
+    def test_export_assignments_json(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        self.register_schedule(m)
+
+        response = self.client.get("/course/1/export", query_string={"format": "json"})
+
+        self.assert_200(response)
+        self.assertIn("application/json", response.content_type)
+        rows = json.loads(response.data.decode("utf-8"))
+        self.assertEqual(len(rows), 2)
+        self.assertEqual(rows[0]["due_at"], "01/31/2020 06:59 PM")
+        self.assertEqual(rows[1]["quiz_id"], 55)
+        self.assertFalse(rows[1]["published"])
+
+    def test_export_assignments_course_not_found(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
 
-    def test_index(self, m):
-        response = self.client.get(self.generate_launch_request("/"))
+        m.register_uri("GET", "/api/v1/courses/1", status_code=404)
+
+        response = self.client.get("/course/1/export", query_string={"format": "csv"})
 
         self.assert_200(response)
-        self.assertEqual(response.data, b"Please contact your System Administrator.")
+        self.assert_template_used("error.htm.j2")
 
-    def test_xml(self, m):
-        response = self.client.get("/lti.xml")
+    def post_import(self, data, filename="dates.csv"):
+        return self.client.post(
+            self.generate_launch_request("/course/1/import", http_method="POST"),
+            data={"file": (io.BytesIO(data), filename)},
+            headers={"X-Ddc-Ajax": True},
+            content_type="multipart/form-data",
+        )
+
+    def test_import_assignments_no_changes(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        self.register_schedule(m)
+
+        response = self.post_import(
+            b"id,published,due_at\n42,true,1/31/2020 6:59 PM\n10,false,\n"
+        )
 
         self.assert_200(response)
-        self.assert_template_used("lti.xml.j2")
-        self.assertIn("application/xml", response.content_type)
+        self.assertFalse(response.json["error"])
+        self.assertEqual(response.json["message"], "No changes to import.")
+        self.assertFalse(any(r.method == "PUT" for r in m.request_history))
 
-    @patch("lti.ALLOWED_CANVAS_DOMAINS", [None])
-    def test_launch(self, m):
-        payload = {"custom_canvas_course_id": "1"}
+    def test_import_assignments_applies_changes(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
 
-        signed_url = self.generate_launch_request(
-            "/launch",
-            http_method="POST",
-            body=payload,
-            headers={"Content-Type": "application/x-www-form-urlencoded"},
+        self.register_schedule(m)
+        m.register_uri(
+            "GET",
+            "/api/v1/courses/1/quizzes/55",
+            json={"id": 55, "title": "Quiz 1", "course_id": 1},
+            status_code=200,
+        )
+        m.register_uri(
+            "PUT",
+            "/api/v1/courses/1/quizzes/55",
+            json={"id": 55, "title": "Quiz 1", "course_id": 1},
+            status_code=200,
         )
 
-        response = self.client.post(signed_url, data=payload)
+        response = self.post_import(
+            json.dumps(
+                [
+                    {"id": 42, "due_at": "01/31/2020 06:59 PM"},
+                    {"id": 10, "due_at": "02/07/2020 11:59 PM", "published": True},
+                ]
+            ).encode("utf-8"),
+            filename="dates.json",
+        )
 
-        self.assertRedirects(response, "/course/1/assignments")
+        self.assert_200(response)
+        self.assertFalse(response.json["error"])
+        self.assertEqual(
+            response.json["updated"], [{"id": "10", "title": "Quiz 1", "type": "Quiz"}]
+        )
+        put = [r for r in m.request_history if r.method == "PUT"]
+        self.assertEqual(len(put), 1)
+        self.assertIn("quiz%5Bpublished%5D=true", put[0].text)
+        self.assertIn("quiz%5Bshow_correct_answers_at%5D=2020-02-01", put[0].text)
 
-    def test_show_assignments_role_student(self, m):
+    def test_import_assignments_invalid_file(self, m):
         with self.client.session_transaction() as sess:
             sess[LTI_SESSION_KEY] = True
             sess["oauth_consumer_key"] = "key"
-            sess["roles"] = "Student"
+            sess["roles"] = "Instructor"
 
-        response = self.client.get(
-            self.generate_launch_request("/course/1/assignments")
+        response = self.post_import(
+            b"id,published,due_at\nabc,true,\n42,maybe,\n43,true,tomorrow\n"
         )
+
         self.assert_200(response)
-        self.assert_template_used("error.htm.j2")
-        self.assertEqual(str(self.get_context_variable("message")), "Not authorized.")
+        self.assertTrue(response.json["error"])
+        self.assertEqual(len(response.json["errors"]), 3)
+        self.assertEqual(m.call_count, 0)
 
-    def test_show_assignments_course_not_found(self, m):
+    def test_import_assignments_not_utf8(self, m):
         with self.client.session_transaction() as sess:
             sess[LTI_SESSION_KEY] = True
             sess["oauth_consumer_key"] = "key"
             sess["roles"] = "Instructor"
 
-        m.register_uri(
-            "GET",
-            "/api/v1/courses/1",
-            json={
-                "errors": [{"message": "The specified resource does not exist."}],
-                "error_report_id": 1234,
-            },
-            status_code=404,
-        )
+        response = self.post_import(b"id,due_at\n1,\xff\xfe\n")
 
-        response = self.client.get(
-            self.generate_launch_request("/course/1/assignments")
+        self.assert_200(response)
+        self.assertTrue(response.json["error"])
+        self.assertEqual(response.json["errors"], ["The file is not valid UTF-8 CSV."])
+        self.assertEqual(m.call_count, 0)
+
+    def test_import_assignments_short_row(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        response = self.post_import(b"id,due_at,lock_at\n1,01/01/2020 11:59 PM\n")
+
+        self.assert_200(response)
+        self.assertTrue(response.json["error"])
+        self.assertEqual(
+            response.json["errors"], ["Row 1: missing a value for lock_at."]
         )
+        self.assertEqual(m.call_count, 0)
+
+    def test_import_assignments_unknown_assignment(self, m):
+        with self.client.session_transaction() as sess:
+            sess[LTI_SESSION_KEY] = True
+            sess["oauth_consumer_key"] = "key"
+            sess["roles"] = "Instructor"
+
+        self.register_schedule(m)
+
+        response = self.post_import(b"id,published\n99,true\n")
+
         self.assert_200(response)
-        self.assert_template_used("error.htm.j2")
-        self.assertEqual(str(self.get_context_variable("message")), "Not Found")
+        self.assertTrue(response.json["error"])
+        self.assertEqual(
+            response.json["errors"], ["Assignment 99 is not in this course."]
+        )
 
-    def test_show_assignments_quizzes_not_found(self, m):
+    def test_show_assignments_overrides(self, m):
         with self.client.session_transaction() as sess:
             sess[LTI_SESSION_KEY] = True
             sess["oauth_consumer_key"] = "key"
@@ -106,24 +975,45 @@ class LTITests(flask_testing.TestCase):
             json={"id": 1, "name": "Course 1"},
             status_code=200,
         )
+        m.register_uri("GET", "/api/v1/courses/1/assignment_groups", json=[])
+        m.register_uri("GET", "/api/v1/courses/1/quizzes", json=[], status_code=200)
         m.register_uri(
             "GET",
-            "/api/v1/courses/1/quizzes",
-            json={
-                "errors": [{"message": "The specified resource does not exist."}],
-                "error_report_id": 1234,
-            },
-            status_code=404,
+            "/api/v1/courses/1/assignments",
+            json=[
+                {
+                    "id": 42,
+                    "name": "The Answer",
+                    "overrides": [
+                        {
+                            "id": 7,
+                            "assignment_id": 42,
+                            "title": 'Section "2" <b>',
+                            "due_at": "2020-01-31T23:59:00Z",
+                        }
+                    ],
+                },
+            ],
+            status_code=200,
         )
 
         response = self.client.get(
             self.generate_launch_request("/course/1/assignments")
         )
-        self.assert_200(response)
-        self.assert_template_used("error.htm.j2")
-        self.assertEqual(str(self.get_context_variable("message")), "Not Found")
 
-    def test_show_assignments_assignments_not_found(self, m):
+        self.assert_200(response)
+        assignment_requests = [
+            r for r in m.request_history if r.path.endswith("/assignments")
+        ]
+        self.assertEqual(len(assignment_requests), 1)
+        self.assertEqual(assignment_requests[0].qs["include[]"], ["overrides"])
+        self.assertIn(b'name="42-override_7_due_at"', response.data)
+        self.assertIn(b'value="01/31/2020 06:59 PM"', response.data)
+        self.assertNotIn(b"42-override_7_unlock_at", response.data)
+        self.assertIn(b"Override for Section &#34;2&#34; &lt;b&gt;", response.data)
+        self.assertNotIn(b"<b>", response.data)
+
+    def test_update_assignments_overrides(self, m):
         with self.client.session_transaction() as sess:
             sess[LTI_SESSION_KEY] = True
             sess["oauth_consumer_key"] = "key"
@@ -137,28 +1027,63 @@ class LTITests(flask_testing.TestCase):
         )
         m.register_uri(
             "GET",
-            "/api/v1/courses/1/quizzes",
-            json=[{"id": 1, "title": "Quiz 1"}, {"id": 2, "title": "Quiz 2"}],
+            "/api/v1/courses/1/assignments/42",
+            json={"id": 42, "name": "The Answer", "course_id": 1},
             status_code=200,
         )
         m.register_uri(
-            "GET",
-            "/api/v1/courses/1/assignments",
-            json={
-                "errors": [{"message": "The specified resource does not exist."}],
-                "error_report_id": 1234,
-            },
-            status_code=404,
+            "PUT",
+            "/api/v1/courses/1/assignments/42",
+            json={"id": 42, "name": "The Answer", "course_id": 1},
+            status_code=200,
+        )
+        m.register_uri(
+            "PUT",
+            "/api/v1/courses/1/assignments/overrides",
+            json=[{"id": 7, "assignment_id": 42, "title": "Section 2"}],
+            status_code=200,
         )
 
-        response = self.client.get(
-            self.generate_launch_request("/course/1/assignments")
+        payload = {
+            "42-assignment_type": "assignment",
+            "42-published": "on",
+            "42-override_7_due_at": "02/07/2020 11:59 PM",
+        }
+        headers = {
+            "X-Ddc-Ajax": True,
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+
+        response = self.client.post(
+            self.generate_launch_request(
+                "/course/1/update",
+                http_method="POST",
+                body=urlencode(payload),
+                headers=headers,
+            ),
+            data=payload,
+            headers=headers,
         )
+
         self.assert_200(response)
-        self.assert_template_used("error.htm.j2")
-        self.assertEqual(str(self.get_context_variable("message")), "Not Found")
+        self.assertFalse(response.json["error"])
+        self.assertEqual(
+            response.json["updated"],
+            [
+                {"id": "42", "title": "The Answer", "type": "Assignment"},
+                {"id": "42", "title": "Section 2", "type": "Override"},
+            ],
+        )
+        override_request = [
+            r for r in m.request_history if r.path.endswith("/overrides")
+        ][0]
+        self.assertEqual(override_request.method, "PUT")
+        self.assertIn("2020-02-07T23%3A59%3A00-05%3A00", override_request.text)
+        self.assertNotIn("unlock_at", override_request.text)
+
+    def test_update_assignments_sequential(self, m):
+        self.app.config["EDIT_WORKERS"] = 1
 
-    def test_show_assignments(self, m):
         with self.client.session_transaction() as sess:
             sess[LTI_SESSION_KEY] = True
             sess["oauth_consumer_key"] = "key"
@@ -170,40 +1095,33 @@ class LTITests(flask_testing.TestCase):
             json={"id": 1, "name": "Course 1"},
             status_code=200,
         )
-        m.register_uri(
-            "GET",
-            "/api/v1/courses/1/quizzes",
-            json=[
-                {
-                    "id": 1,
-                    "title": "Quiz 1",
-                    "show_correct_answers_at": "2017-01-01T00:00:01Z",
-                    "hide_correct_answers_at": "2017-12-31T23:59:59Z",
-                },
-                {"id": 2, "title": "Quiz 2"},
-            ],
-            status_code=200,
-        )
-        m.register_uri(
-            "GET",
-            "/api/v1/courses/1/assignments",
-            json=[
-                {"id": 1, "title": "Non-Quiz Assignment 1"},
-                {"id": 2, "title": "Quiz 1", "quiz_id": 1},
-                {"id": 3, "title": "Quiz 2", "quiz_id": 2},
-                {"id": 4, "title": "Non- Quiz Assignment 2"},
-            ],
-            status_code=200,
-        )
+        m.register_uri("GET", "/api/v1/courses/1/assignments/42", status_code=404)
 
-        response = self.client.get(
-            self.generate_launch_request("/course/1/assignments")
+        payload = {
+            "42-assignment_type": "assignment",
+            "43-assignment_type": "assignment",
+        }
+        headers = {
+            "X-Ddc-Ajax": True,
+            "Content-Type": "application/x-www-form-urlencoded",
+        }
+
+        response = self.client.post(
+            self.generate_launch_request(
+                "/course/1/update",
+                http_method="POST",
+                body=urlencode(payload),
+                headers=headers,
+            ),
+            data=payload,
+            headers=headers,
         )
+
         self.assert_200(response)
-        self.assert_template_used("assignments.htm.j2")
-        assignments = self.get_context_variable("assignments")
-        self.assertIsInstance(assignments, list)
-        self.assertEqual(len(assignments), 4)
+        self.assertTrue(response.json["error"])
+        self.assertEqual(len(response.json["updated"]), 0)
+        # Editing stops at the first failure.
+        self.assertFalse(any(r.path.endswith("/43") for r in m.request_history))
 
     def test_update_assignments_role_student(self, m):
         with self.client.session_transaction() as sess:
@@ -568,34 +1486,369 @@ class LTITests(flask_testing.TestCase):
         )
         self.assertEqual(len(response.json["updated"]), 2)
 
-    @staticmethod
-    def generate_launch_request(
-        url,
-        body=None,
-        http_method="GET",
-        base_url="http://localhost",
-        roles="Instructor",
-        headers=None,
-    ):
-        params = {}
-
-        if roles is not None:
-            params["roles"] = roles
-
-        urlparams = urlencode(params)
-
-        client = oauthlib.oauth1.Client(
-            "key",
-            client_secret="secret",
-            signature_method=oauthlib.oauth1.SIGNATURE_HMAC,
-            signature_type=oauthlib.oauth1.SIGNATURE_TYPE_QUERY,
-        )
-        signature = client.sign(
-            "{}{}?{}".format(base_url, url, urlparams),
-            body=body,
-            http_method=http_method,
-            headers=headers,
+    generate_launch_request = staticmethod(generate_launch_request)
+
+
+class CachedCheckTests(unittest.TestCase):
+    def test_refreshes_in_background_when_stale(self):
+        calls = []
+        done = threading.Event()
+
+        def check():
+            calls.append(1)
+            done.set()
+            return True
+
+        cached = health.CachedCheck(check, ttl=60)
+
+        self.assertEqual(cached.result(), (None, None))
+        self.assertTrue(done.wait(5))
+
+        # Give the refresh thread a moment to store its result.
+        for _ in range(100):
+            value, checked_at = cached.result()
+            if checked_at is not None:
+                break
+            time.sleep(0.01)
+
+        self.assertTrue(value)
+        self.assertEqual(len(calls), 1)
+
+    def test_failing_check_is_unhealthy(self):
+        def check():
+            raise ValueError("Canvas is down")
+
+        cached = health.CachedCheck(check, ttl=60)
+
+        self.assertFalse(cached.refresh())
+        self.assertFalse(cached.result()[0])
+
+
+class ListHandler(logging.Handler):
+    def __init__(self, block=None):
+        logging.Handler.__init__(self)
+        self.block = block
+        self.records = []
+
+    def emit(self, record):
+        if self.block is not None:
+            self.block.wait(5)
+        self.records.append(record)
+
+
+@unittest.skipIf(logqueue.QueueHandler is None, "QueueHandler requires Python 3")
+class LogQueueTests(unittest.TestCase):
+    def make_logger(self, handler):
+        logger = logging.getLogger("tests.logqueue.{}".format(id(handler)))
+        logger.propagate = False
+        logger.addHandler(handler)
+        self.addCleanup(logger.removeHandler, handler)
+        self.addCleanup(handler.close)
+        return logger
+
+    def test_records_written_by_listener(self):
+        target = ListHandler()
+        handler = logqueue.BufferedQueueHandler([target], maxsize=10)
+        logger = self.make_logger(handler)
+
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            logger.exception("Error editing assignment #%s.", 42)
+        handler.stop()
+
+        self.assertEqual(len(target.records), 1)
+        record = target.records[0]
+        self.assertEqual(record.getMessage(), "Error editing assignment #42.")
+        self.assertIn("ValueError: boom", record.exc_text)
+        self.assertNotEqual(handler.listener._thread, threading.current_thread())
+
+    def test_full_queue_drops_and_reports(self):
+        block = threading.Event()
+        target = ListHandler(block)
+        handler = logqueue.BufferedQueueHandler([target], maxsize=1)
+        logger = self.make_logger(handler)
+
+        for number in range(5):
+            logger.error("Record %s", number)
+        self.assertGreaterEqual(handler.stats()["dropped"], 3)
+
+        # A forked child that hasn't logged yet reports its own empty queue,
+        # not the copy of its parent's.
+        pid, handler._pid = handler._pid, -1
+        self.assertEqual(handler.stats(), {"queued": 0, "capacity": 1, "dropped": 0})
+        handler._pid = pid
+
+        block.set()
+        for _ in range(100):
+            if handler.stats()["queued"] == 0:
+                break
+            time.sleep(0.01)
+        logger.error("After")
+        handler.stop()
+
+        messages = [record.getMessage() for record in target.records]
+        self.assertTrue(any(m.startswith("Log queue was full.") for m in messages))
+        self.assertEqual(messages[-1], "After")
+
+    def test_json_formatter(self):
+        formatter = logqueue.JSONFormatter()
+        try:
+            raise ValueError("boom")
+        except ValueError:
+            record = logging.LogRecord(
+                "lti", logging.ERROR, "lti.py", 10, "Failed %s", (1,), sys.exc_info()
+            )
+
+        data = json.loads(formatter.format(record))
+
+        self.assertEqual(data["level"], "ERROR")
+        self.assertEqual(data["message"], "Failed 1")
+        self.assertEqual(data["line"], 10)
+        self.assertIn("ValueError: boom", data["exception"])
+
+
+class ClientRegistryTests(unittest.TestCase):
+    def make_registry(self, **config):
+        import clients
+
+        settings = dict(
+            lti.DEFAULT_CONFIG, CANVAS_URL="https://example.com", API_KEY="key"
+        )
+        settings.update(config)
+        return clients.ClientRegistry(settings)
+
+    def test_one_client_per_domain(self):
+        import clients
+
+        registry = self.make_registry(
+            CANVAS_DOMAINS={
+                "beta.example.edu": {"url": "https://beta.example.edu"},
+                "test.example.edu": {"url": "https://test.example.edu", "pool_size": 2},
+            }
+        )
+
+        beta = registry.get("beta.example.edu")
+        test = registry.get("test.example.edu")
+
+        self.assertIs(registry.get("beta.example.edu"), beta)
+        self.assertIsNot(beta, test)
+        self.assertIs(registry.get("other.example.edu"), registry.get())
+        self.assertEqual(registry.url("test.example.edu"), "https://test.example.edu")
+        self.assertEqual(registry.url("other.example.edu"), "https://example.com")
+
+        beta_adapter = clients.requests_session(beta).get_adapter("https://")
+        test_adapter = clients.requests_session(test).get_adapter("https://")
+        self.assertIsNot(beta_adapter.limiter, test_adapter.limiter)
+        self.assertEqual(test_adapter._pool_maxsize, 2)
+
+    def test_busy_domain_fails_fast(self):
+        import clients
+
+        registry = self.make_registry(
+            CANVAS_DOMAINS={"beta.example.edu": {"max_concurrent": 1, "wait": 0}}
+        )
+        session = clients.requests_session(registry.get("beta.example.edu"))
+        adapter = session.get_adapter("https://")
+
+        self.assertTrue(adapter.limiter.acquire(0))
+        with self.assertRaises(clients.CanvasBusy):
+            session.get("https://example.com/api/v1/users/self")
+
+        # Other domains keep their own budget.
+        other = clients.requests_session(registry.get()).get_adapter("https://")
+        self.assertTrue(other.limiter.acquire(0))
+
+    def test_slot_held_while_body_is_read(self):
+        import clients
+        import requests
+
+        limiter = clients.Limiter(max_concurrent=1)
+        in_flight = []
+
+        class Body(io.BytesIO):
+            def read(self, *args, **kwargs):
+                in_flight.append(limiter.in_flight)
+                return io.BytesIO.read(self, *args, **kwargs)
+
+        def send(adapter, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 200
+            response.raw = Body(b"[]")
+            return response
+
+        adapter = clients.LimitedAdapter(limiter, 0)
+        with mock.patch.object(clients.HTTPAdapter, "send", send):
+            response = adapter.send(None)
+
+        self.assertEqual(response.content, b"[]")
+        self.assertEqual(set(in_flight), {1})
+        self.assertEqual(limiter.in_flight, 0)
+
+    def test_missing_requests_session(self):
+        import clients
+
+        with self.assertRaises(RuntimeError):
+            clients.requests_session(object())
+
+    def test_rate_limit(self):
+        import clients
+
+        limiter = clients.Limiter(max_concurrent=5, rate=20, burst=2)
+
+        self.assertTrue(limiter.acquire(0))
+        self.assertTrue(limiter.acquire(0))
+        self.assertFalse(limiter.acquire(0))
+        # The next token arrives after 1/20th of a second.
+        self.assertTrue(limiter.acquire(1))
+
+        limiter = clients.Limiter(max_concurrent=1)
+        self.assertTrue(limiter.acquire(0))
+        self.assertFalse(limiter.acquire(0))
+        limiter.release()
+        self.assertTrue(limiter.acquire(0))
+
+
+class CourseCacheTests(unittest.TestCase):
+    def test_expires_after_ttl(self):
+        courses = cache.CourseCache(60, 10)
+        courses.set("https://example.com", 1, "data", time.time())
+        self.assertEqual(courses.get("https://example.com", "1"), "data")
+        self.assertIsNone(courses.get("https://beta.example.com", "1"))
+
+        courses.set("https://example.com", 1, "data", time.time() - 60)
+        self.assertIsNone(courses.get("https://example.com", "1"))
+
+    def test_invalidation_shared_through_marker_dir(self):
+        marker_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, marker_dir)
+        worker_1 = cache.CourseCache(60, 10, marker_dir)
+        worker_2 = cache.CourseCache(60, 10, marker_dir)
+
+        fetched_at = time.time() - 1
+        worker_1.set("https://example.com", "1", "data", fetched_at)
+        worker_2.set("https://example.com", "1", "data", fetched_at)
+        worker_2.set("https://example.com", "2", "data", fetched_at)
+
+        worker_1.invalidate("1")
+
+        self.assertIsNone(worker_1.get("https://example.com", "1"))
+        self.assertIsNone(worker_2.get("https://example.com", "1"))
+        self.assertEqual(worker_2.get("https://example.com", "2"), "data")
+
+    def test_marker_dir_created_on_first_invalidation(self):
+        parent = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, parent)
+        marker_dir = os.path.join(parent, "cache", "courses")
+        courses = cache.CourseCache(60, 10, marker_dir)
+
+        self.assertIsNone(courses.get("https://example.com", "1"))
+        courses.invalidate("1")
+
+        self.assertTrue(os.path.isfile(courses.marker_path("1")))
+
+    def test_invalidated_mid_fetch(self):
+        courses = cache.CourseCache(60, 10)
+        fetched_at = time.time()
+        courses.invalidate("1")
+        courses.set("https://example.com", "1", "data", fetched_at)
+
+        self.assertIsNone(courses.get("https://example.com", "1"))
+
+
+class StackSamplerTests(unittest.TestCase):
+    def test_one_thread_samples_every_request(self):
+        import profiling
+
+        sampler = profiling.StackSampler()
+        done = threading.Event()
+
+        def slow_request():
+            done.wait()
+
+        requests = [threading.Thread(target=slow_request) for _ in range(2)]
+        for request in requests:
+            request.start()
+        self.addCleanup(done.set)
+        before = threading.active_count()
+
+        counts = [sampler.register(request.ident, 0.001) for request in requests]
+        self.assertEqual(threading.active_count(), before + 1)
+        for _ in range(100):
+            if all(counts):
+                break
+            time.sleep(0.01)
+
+        for request in requests:
+            sampler.unregister(request.ident)
+        done.set()
+        for request in requests:
+            request.join()
+
+        for request_counts in counts:
+            self.assertTrue(request_counts)
+            self.assertTrue(
+                all("slow_request(tests.py:" in stack for stack in request_counts)
+            )
+        for _ in range(100):
+            if threading.active_count() == before - 2:
+                break
+            time.sleep(0.01)
+        self.assertEqual(threading.active_count(), before - 2)
+
+
+class LoadTestTests(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        logging.disable(logging.CRITICAL)
+
+    @classmethod
+    def tearDownClass(cls):
+        logging.disable(logging.NOTSET)
+
+    def test_run(self):
+        import loadtest
+
+        rows = loadtest.run(levels=(2,), sessions=2, assignments=8, latency=0)
+
+        self.assertEqual(
+            {(row["mode"], row["step"]) for row in rows},
+            {
+                (mode, step)
+                for mode in ("sync", "concurrent")
+                for step in ("all", "launch", "show_assignments", "update_assignments")
+            },
         )
-        signed_url = signature[0]
-        new_url = signed_url[len(base_url) :]
-        return new_url
+        for row in rows:
+            self.assertEqual(row["error_rate"], 0.0)
+            self.assertEqual(row["requests"], 6 if row["step"] == "all" else 2)
+
+    def test_percentile(self):
+        import loadtest
+
+        values = list(range(1, 101))
+
+        self.assertEqual(loadtest.percentile(values, 50), 50)
+        self.assertEqual(loadtest.percentile(values, 99), 99)
+        self.assertEqual(loadtest.percentile([], 99), 0.0)
+
+
+class StartupTests(unittest.TestCase):
+    def test_startup_is_lazy(self):
+        script = (
+            "import json, sys, time\n"
+            "start = time.time()\n"
+            "import lti\n"
+            "lti.create_app()\n"
+            "elapsed = time.time() - start\n"
+            "print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))\n"
+        )
+        output = subprocess.check_output(
+            [sys.executable, "-c", script],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        )
+        result = json.loads(output.decode("utf-8"))
+
+        for module in ("canvasapi", "pylti", "requests"):
+            self.assertNotIn(module, result["modules"])
+        self.assertLess(result["elapsed"], STARTUP_BUDGET)